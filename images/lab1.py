@@ -2,9 +2,140 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
 import numpy as np
-from scipy import ndimage
+from collections import OrderedDict
+import hashlib
+import queue
+import stat
+import tempfile
+import threading
+import weakref
 import os
 
+import lab1_trace
+from lab1_trace import stage
+
+# Уся обробка зображень - у lab1_filters (без GUI); тут лише інтерфейс
+from lab1_filters import (GAUSSIAN_HIGHPASS_KERNEL, LAPLACIAN_LOWPASS_KERNEL, PREDEFINED_FILTERS, FilterCache,
+                          apply_gradient, apply_kernel, gaussian_highpass, is_edge_kernel, laplacian_lowpass)
+
+
+def open_preview(file_path, max_size):
+    """Швидке відкриття зменшеної копії зображення для відображення.
+
+    thumbnail спочатку викликає Image.draft (JPEG декодується одразу в 1/2, 1/4 або 1/8
+    розміру), а для інших форматів використовує Image.reduce перед фінальним LANCZOS,
+    тому повне декодування великого файлу не потрібне.
+    """
+    preview = Image.open(file_path)
+    preview.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return preview
+
+
+def prepare_for_saving(image, file_path):
+    """Підготовка зображення до формату файлу (JPEG не підтримує альфа-канал)."""
+    if file_path.lower().endswith(('.jpg', '.jpeg')) and image.mode == 'RGBA':
+        rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+        rgb_image.paste(image, mask=image.split()[3])
+        return rgb_image
+    return image
+
+
+def _current_umask():
+    # Прочитати umask можна лише встановивши новий, тому це робиться один раз
+    # при імпорті (у головному потоці), а не в потоці збереження
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _current_umask()
+
+
+def save_atomically(image, file_path):
+    """Запис через тимчасовий файл у тій самій папці та перейменування.
+
+    Файл або повністю замінюється новим, або (у разі помилки) лишається старим.
+    """
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    image = prepare_for_saving(image, file_path)
+    fd, temp_path = tempfile.mkstemp(suffix=ext, prefix='.saving-', dir=os.path.dirname(os.path.abspath(file_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if ext in ['.jpg', '.jpeg']:
+                image.save(f, 'JPEG', quality=95)
+            else:
+                image_format = Image.registered_extensions().get(ext)
+                if image_format is None:
+                    raise ValueError(f"Невідоме розширення файлу: {ext}")
+                image.save(f, image_format)
+        # mkstemp створює файл з правами 0600; новий файл має отримати права за umask,
+        # як при звичайному image.save, а перезаписаний - зберегти свої
+        try:
+            mode = stat.S_IMODE(os.stat(file_path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class BackgroundSaver:
+    """Кодування і запис зображень у фоновому потоці.
+
+    Завдання ставляться в обмежену чергу (max_pending), тож незбережені
+    зображення не накопичуються без меж: якщо черга заповнена, submit
+    повертає False. Події ('start', 'done', 'error') складаються в events
+    і читаються потоком GUI (tkinter не можна викликати з інших потоків).
+    """
+
+    def __init__(self, max_pending=4):
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.events = queue.Queue()
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, image, file_path):
+        """Додає зображення до черги збереження; False, якщо черга заповнена."""
+        # Лічильник збільшується до постановки в чергу: інакше потік запису
+        # може встигнути зменшити його раніше
+        with self.lock:
+            self.pending += 1
+        try:
+            self.jobs.put_nowait((image, file_path))
+        except queue.Full:
+            with self.lock:
+                self.pending -= 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            image, file_path = job
+            self.events.put(('start', file_path, None))
+            try:
+                save_atomically(image, file_path)
+                self.events.put(('done', file_path, None))
+            except Exception as e:
+                self.events.put(('error', file_path, e))
+            finally:
+                with self.lock:
+                    self.pending -= 1
+
+    def close(self):
+        """Дочекатися запису всіх завдань у черзі і зупинити потік."""
+        self.jobs.put(None)
+        self.worker.join()
+
+
 class ImageProcessor:
     def __init__(self, root):
         self.root = root
@@ -14,28 +145,28 @@ class ImageProcessor:
         # Змінні для зберігання зображень
         self.original_image = None
         self.current_image = None
+        self.original_preview = None
         self.original_photo_image = None
         self.processed_photo_image = None
         self.current_file_path = None
 
+        # Кеш відмальованих мініатюр: (id зображення, розмір, ресемплінг) -> PhotoImage
+        self.render_cache = OrderedDict()
+        self.render_cache_size = 8
+        self.display_resample = Image.Resampling.LANCZOS
+        self._resize_job = None
+
+        # Кеш результатів фільтрів (FILTER_CACHE_DIR вмикає збереження на диск)
+        self.filter_cache = FilterCache(cache_dir=os.environ.get('FILTER_CACHE_DIR'))
+        # Хеші вмісту зображень: id зображення -> (слабке посилання, хеш)
+        self.image_digests = {}
+
+        # Фонове збереження: кодування PNG/JPEG/TIFF не блокує інтерфейс
+        self.saver = BackgroundSaver()
+        self.root.after(100, self._poll_saves)
+
         # Попередньо визначені фільтри
-        self.predefined_filters = {
-            'Laplace': np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]]),
-            'Hipass': np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]]),
-            'Edge detection': np.array([[-1, -1, -1], [-1, 8, -1], [-1, -1, -1]]),
-            'Sharpen': np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]]),
-            'Softening': np.array([[1, 1, 1], [1, 1, 1], [1, 1, 1]]) / 9,  # Виправлено: правильна нормалізація
-            'Gaussian 3x3': np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]]) / 16,
-            'Gaussian 5x5': np.array([[1, 4, 6, 4, 1],
-                                      [4, 16, 24, 16, 4],
-                                      [6, 24, 36, 24, 6],
-                                      [4, 16, 24, 16, 4],
-                                      [1, 4, 6, 4, 1]]) / 256,
-            'Prewitt X': np.array([[-1, 0, 1], [-1, 0, 1], [-1, 0, 1]]),
-            'Prewitt Y': np.array([[1, 1, 1], [0, 0, 0], [-1, -1, -1]]),
-            'Sobel X': np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]]),
-            'Sobel Y': np.array([[1, 2, 1], [0, 0, 0], [-1, -2, -1]])
-        }
+        self.predefined_filters = dict(PREDEFINED_FILTERS)
 
         # Створення GUI
         self.create_menu()
@@ -60,8 +191,14 @@ class ImageProcessor:
         menubar.add_cascade(label="Обробка", menu=process_menu)
         process_menu.add_command(label="Перетворити в напівтонове", command=self.convert_to_grayscale)
         process_menu.add_command(label="Відновити оригінал", command=self.restore_original)
+        process_menu.add_command(label="Порівняти з оригіналом", command=self.show_comparison)
         process_menu.add_separator()
         process_menu.add_command(label="Користувацький фільтр", command=self.custom_filter_dialog)
+        process_menu.add_separator()
+        # LAB1_TRACE=шлях.jsonl вмикає профілювання з самого запуску і запис етапів у файл
+        self.profiling_var = tk.BooleanVar(value=bool(os.environ.get('LAB1_TRACE')))
+        process_menu.add_checkbutton(label="Показувати час етапів", variable=self.profiling_var,
+                                     command=self.toggle_profiling)
 
     def create_toolbar(self):
         toolbar = ttk.Frame(self.root)
@@ -125,57 +262,35 @@ class ImageProcessor:
         self.processed_canvas.pack(fill=tk.BOTH, expand=True)
         paned_window.add(right_frame, weight=1)
 
-    def create_status_bar(self):
-        self.status_bar = ttk.Label(self.root, text="Готово", relief=tk.SUNKEN, anchor=tk.W)
-        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
-
-    def open_image(self):
-        file_path = filedialog.askopenfilename(
-            title="Виберіть зображення",
-            filetypes=[("Image Files", "*.jpeg *.jpg *.png *.tiff *.tif *.bmp *.gif"), ("All files", "*.*")]
-        )
-        if not file_path: return
-
-        try:
-            self.original_image = Image.open(file_path)
-            self.current_image = self.original_image.copy()
-            self.current_file_path = file_path
-
-            self.display_original_image()
-            self.display_processed_image()
-
-            self.update_image_info()
-            self.status_bar.config(text=f"Завантажено: {os.path.basename(file_path)}")
-        except Exception as e:
-            messagebox.showerror("Помилка", f"Не вдалося відкрити зображення:\n{e}")
-
-    def _display_image_on_canvas(self, image_to_display, canvas, photo_image_attr):
-        if not image_to_display: return
-
-        self.root.update_idletasks()
-        canvas_width = canvas.winfo_width()
-        canvas_height = canvas.winfo_height()
-
-        if canvas_width <= 1: canvas_width = 600
-        if canvas_height <= 1: canvas_height = 600
-
-        img_width, img_height = image_to_display.size
-        scale = min(canvas_width / img_width, canvas_height / img_height) * 0.98
-
-
-        display_image = image_to_display.resize((int(img_width * scale), int(img_height * scale)), Image.Resampling.LANCZOS) if scale < 1.0 else image_to_display
-
-        photo_image = ImageTk.PhotoImage(display_image)
-        setattr(self, photo_image_attr, photo_image)
+        self.original_canvas.bind('<Configure>', self._on_canvas_resize)
+        self.processed_canvas.bind('<Configure>', self._on_canvas_resize)
 
-        canvas.delete("all")
-        canvas.create_image(canvas_width / 2, canvas_height / 2, anchor=tk.CENTER, image=photo_image)
-
-    def display_original_image(self):
-        self._display_image_on_canvas(self.original_image, self.original_canvas, 'original_photo_image')
+    def create_status_bar(self):
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_bar = ttk.Label(status_frame, text="Готово", relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Час етапів останньої операції (лише коли профілювання увімкнене)
+        self.timing_bar = ttk.Label(status_frame, text="", relief=tk.SUNKEN, anchor=tk.E)
+        self.timing_bar.pack(side=tk.RIGHT)
+        if self.profiling_var.get():
+            lab1_trace.enable(os.environ.get('LAB1_TRACE'))
+
+    def toggle_profiling(self):
+        """Увімкнення/вимкнення вимірювання часу етапів"""
+        if self.profiling_var.get():
+            lab1_trace.enable(os.environ.get('LAB1_TRACE'))
+            self.timing_bar.config(text="Профілювання увімкнене")
+        else:
+            lab1_trace.disable()
+            self.timing_bar.config(text="")
 
-    def display_processed_image(self):
-        self._display_image_on_canvas(self.current_image, self.processed_canvas, 'processed_photo_image')
+    def show_timings(self):
+        """Показує в рядку стану час етапів, виміряних з попереднього показу."""
+        if lab1_trace.is_enabled():
+            records = lab1_trace.take_records()
+            if records:
+                self.timing_bar.config(text=lab1_trace.format_records(records))
 
     def apply_custom_kernel(self, kernel):
         """
@@ -186,49 +301,17 @@ class ImageProcessor:
             return
 
         try:
-            # Створюємо робочу копію зображення
-            image_to_process = self.current_image.copy()
-
-            # КРОК 1: ВИЗНАЧЕННЯ ТИПУ ФІЛЬТРА
-            # Якщо в ядрі є від'ємні значення (як у Sobel, Laplace), це, ймовірно,
-            # фільтр для виділення контурів. Такі фільтри найкраще працюють з одним каналом яскравості.
-            is_edge_detection_filter = np.any(kernel < 0)
-
-            # КРОК 2: ПЕРЕТВОРЕННЯ В НАПІВТОНОВЕ (ЯКЩО ПОТРІБНО)
-            # Це ключове виправлення. Фільтри контурів працюють з яскравістю, не з кольором.
-            if is_edge_detection_filter and image_to_process.mode != 'L':
-                image_to_process = image_to_process.convert('L')
-
-            # Конвертуємо зображення в масив NumPy для обчислень
-            img_array = np.array(image_to_process, dtype=np.float64)
-
-            # КРОК 3: ЗАСТОСУВАННЯ ФІЛЬТРА (ЗГОРТКА)
-            if img_array.ndim == 2:  # Напівтонове зображення (один канал)
-                filtered = ndimage.convolve(img_array, kernel)
-            else:  # Кольорове зображення (тільки для фільтрів без від'ємних значень, як розмиття)
-                filtered = np.zeros_like(img_array, dtype=np.float64)
-                for i in range(img_array.shape[2]):  # Застосовуємо до кожного каналу (R, G, B)
-                    filtered[:, :, i] = ndimage.convolve(img_array[:, :, i], kernel)
-
-            # КРОК 4: КОРЕКТНА НОРМАЛІЗАЦІЯ РЕЗУЛЬТАТУ
-            # Це найважливіша частина виправлення
-            if is_edge_detection_filter:
-                # Для фільтрів контурів ми хочемо бачити абсолютну величину змін яскравості.
-                # Це дозволяє побачити і світлі, і темні контури.
-                filtered_abs = np.abs(filtered)
-                # Розтягуємо діапазон значень до 0-255 для візуалізації.
-                if np.max(filtered_abs) > 0:
-                    final_array = (255.0 * filtered_abs / np.max(filtered_abs)).astype(np.uint8)
-                else:
-                    final_array = np.zeros_like(filtered, dtype=np.uint8)
-            else:
-                # Для інших фільтрів (наприклад, розмиття) ми просто обрізаємо значення,
-                # щоб вони залишалися в діапазоні 0-255. Це працює правильно, якщо
-                # сума ядра = 1 (як у 'Softening' або 'Gaussian').
-                final_array = np.clip(filtered, 0, 255).astype(np.uint8)
+            def compute():
+                # Фільтри контурів працюють з яскравістю, не з кольором. Конвертацію робить PIL,
+                # бо він підтримує будь-який режим зображення (P, CMYK, I;16...)
+                image_to_process = self.current_image
+                if is_edge_kernel(kernel) and image_to_process.mode != 'L':
+                    image_to_process = image_to_process.convert('L')
+                # Згортка і нормалізація - у lab1_filters (без GUI)
+                return apply_kernel(np.array(image_to_process), kernel)
 
-            # Оновлюємо поточне зображення
-            self.current_image = Image.fromarray(final_array)
+            # Оновлюємо поточне зображення (повторне застосування береться з кешу)
+            self._apply_cached_filter('kernel', kernel, compute)
             self.display_processed_image()
             self.update_image_info()
 
@@ -236,104 +319,25 @@ class ImageProcessor:
             messagebox.showerror("Помилка", f"Помилка при застосуванні фільтра:\n{str(e)}")
 
 
-    
-    def apply_selected_filter(self):
-        filter_name = self.filter_combo.get()
-        if filter_name == 'Prewitt': self.apply_prewitt()
-        elif filter_name == 'Sobel': self.apply_sobel()
-        else: self.apply_filter(filter_name)
-
-    def apply_filter(self, filter_name):
-        if not self.current_image: messagebox.showwarning("Увага", "Спочатку відкрийте зображення"); return
-        if filter_name in self.predefined_filters:
-            self.apply_custom_kernel(self.predefined_filters[filter_name])
-            self.status_bar.config(text=f"Застосовано фільтр: {filter_name}")
-
     def apply_gradient_filter(self, kernel_x, kernel_y, filter_name):
+        """Градієнтний фільтр (Prewitt, Sobel); повертає True у разі успіху"""
         if not self.current_image: 
             messagebox.showwarning("Увага", "Спочатку відкрийте зображення")
-            return
+            return False
         try:
-            img_array = np.array(self.current_image.convert('L'), dtype=np.float64)
-            grad_x = ndimage.convolve(img_array, kernel_x)
-            grad_y = ndimage.convolve(img_array, kernel_y)
-            
-            # Обчислення градієнта (величина вектора градієнта)
-            gradient = np.sqrt(grad_x**2 + grad_y**2)
-            
-            # Нормалізація до діапазону 0-255
-            if np.max(gradient) > 0:
-                gradient = (255.0 * gradient / np.max(gradient)).astype(np.uint8)
-            else:
-                gradient = np.zeros_like(gradient, dtype=np.uint8)
+            def compute():
+                # Величина вектора градієнта, нормалізована до діапазону 0-255
+                return apply_gradient(np.array(self.current_image.convert('L')), kernel_x, kernel_y)
             
-            self.current_image = Image.fromarray(gradient)
+            self._apply_cached_filter('gradient', [kernel_x, kernel_y], compute)
             self.display_processed_image()
             self.update_image_info()
             self.status_bar.config(text=f"Застосовано фільтр {filter_name}")
+            return True
         except Exception as e:
             messagebox.showerror("Помилка", f"Помилка при застосуванні фільтра {filter_name}:\n{e}")
+            return False
 
-    def apply_prewitt(self):
-        self.apply_gradient_filter(self.predefined_filters['Prewitt X'], self.predefined_filters['Prewitt Y'], 'Прюіта')
-
-    def apply_sobel(self):
-        self.apply_gradient_filter(self.predefined_filters['Sobel X'], self.predefined_filters['Sobel Y'], 'Собеля')
-
-
-    def save_image(self):
-        self.save_image_as(self.current_file_path) if self.current_image and self.current_file_path else self.save_image_as()
-            
-    def save_image_as(self, file_path=None):
-        if not self.current_image: messagebox.showwarning("Увага", "Немає зображення для збереження"); return
-
-        if file_path is None:
-            file_path = filedialog.asksaveasfilename(title="Зберегти зображення як", defaultextension=".png", filetypes=[("PNG", "*.png"), ("JPEG", "*.jpg"), ("BMP", "*.bmp")])
-        
-        if not file_path: return
-
-        try:
-            image_to_save = self.current_image
-            if file_path.lower().endswith(('.jpg', '.jpeg')) and image_to_save.mode == 'RGBA':
-                rgb_image = Image.new("RGB", image_to_save.size, (255, 255, 255))
-                rgb_image.paste(image_to_save, mask=image_to_save.split()[3])
-                image_to_save = rgb_image
-
-            image_to_save.save(file_path)
-            self.current_file_path = file_path
-            self.status_bar.config(text=f"Збережено: {os.path.basename(file_path)}")
-        except Exception as e:
-            messagebox.showerror("Помилка", f"Не вдалося зберегти зображення:\n{e}")
-
-    def convert_to_grayscale(self):
-        if self.current_image:
-            self.current_image = self.current_image.convert('L')
-            # --- ВИПРАВЛЕННЯ: Викликаємо правильну функцію ---
-            self.display_processed_image()
-            self.update_image_info()
-            self.status_bar.config(text="Зображення перетворено в напівтонове")
-        else:
-            messagebox.showwarning("Увага", "Спочатку відкрийте зображення")
-
-    def restore_original(self):
-        if self.original_image:
-            self.current_image = self.original_image.copy()
-            # --- ВИПРАВЛЕННЯ: Викликаємо правильну функцію ---
-            self.display_processed_image()
-            self.update_image_info()
-            self.status_bar.config(text="Відновлено оригінальне зображення")
-        else:
-            messagebox.showwarning("Увага", "Немає оригінального зображення для відновлення")
-
-
-    def update_image_info(self):
-        if self.current_image:
-            mode_map = {'RGB': 'Кольорове (RGB)', 'RGBA': 'Кольорове (RGBA)', 'L': 'Напівтонове'}
-            mode_text = mode_map.get(self.current_image.mode, self.current_image.mode)
-            self.info_label.config(text=f"Розмір: {self.current_image.width}x{self.current_image.height} | Режим: {mode_text}")
-        else:
-            self.info_label.config(text="Зображення не завантажено")
-        
     def custom_filter_dialog(self):
         """Діалогове вікно для створення користувацького фільтра"""
         if not self.current_image:
@@ -467,57 +471,6 @@ class ImageProcessor:
         ttk.Button(button_frame, text="Застосувати", command=apply_custom_filter).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Скасувати", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
         
-        def apply_custom_kernel(self, kernel):
-            """
-            Застосування користувацького ядра фільтра з коректною обробкою режимів зображення.
-            """
-            if not self.current_image:
-                messagebox.showwarning("Увага", "Спочатку відкрийте зображення")
-                return
-
-            try:
-                # Створюємо робочу копію зображення
-                image_to_process = self.current_image.copy()
-
-                # КРОК 1: ВИЗНАЧЕННЯ ТИПУ ФІЛЬТРА
-                # Якщо в ядрі є від'ємні значення (як у Sobel, Prewitt, Laplace),
-                # то це фільтр для виділення контурів, і він повинен працювати з одним каналом яскравості.
-                is_edge_detection_filter = np.any(kernel < 0)
-
-                # КРОК 2: ПРИМУСОВА КОНВЕРТАЦІЯ В НАПІВТОНОВЕ ('L')
-                # Це ключове виправлення! Воно відкине зайвий альфа-канал з режиму 'LA'.
-                if is_edge_detection_filter and image_to_process.mode != 'L':
-                    image_to_process = image_to_process.convert('L')
-
-                img_array = np.array(image_to_process, dtype=np.float64)
-
-                # КРОК 3: ЗАСТОСУВАННЯ ФІЛЬТРА (тепер тільки до одного каналу)
-                if img_array.ndim == 2:
-                    filtered = ndimage.convolve(img_array, kernel)
-                else:  # Цей блок тепер буде виконуватися тільки для фільтрів розмиття на кольорових зображеннях
-                    filtered = np.zeros_like(img_array, dtype=np.float64)
-                    for i in range(img_array.shape[2]):
-                        filtered[:, :, i] = ndimage.convolve(img_array[:, :, i], kernel)
-
-                # КРОК 4: КОРЕКТНА НОРМАЛІЗАЦІЯ РЕЗУЛЬТАТУ
-                if is_edge_detection_filter:
-                    # Для фільтрів контурів ми візуалізуємо абсолютну величину змін яскравості.
-                    filtered_abs = np.abs(filtered)
-                    if np.max(filtered_abs) > 0:
-                        final_array = (255.0 * filtered_abs / np.max(filtered_abs)).astype(np.uint8)
-                    else:
-                        final_array = np.zeros_like(filtered, dtype=np.uint8)
-                else:
-                    # Для фільтрів розмиття просто обрізаємо значення
-                    final_array = np.clip(filtered, 0, 255).astype(np.uint8)
-
-                self.current_image = Image.fromarray(final_array)
-                self.display_processed_image()
-                self.update_image_info()
-
-            except Exception as e:
-                messagebox.showerror("Помилка", f"Помилка при застосуванні фільтра:\n{str(e)}")
-    
     def apply_selected_filter(self):
         """Застосування вибраного з комбобокса фільтра"""
         filter_name = self.filter_combo.get()
@@ -542,68 +495,15 @@ class ImageProcessor:
     
     def apply_prewitt(self):
         """Застосування фільтра Прюіта"""
-        if not self.current_image:
-            messagebox.showwarning("Увага", "Спочатку відкрийте зображення")
-            return
-        try:
-            # 1. Надійно конвертуємо зображення у напівтонове ('L' - Luminance)
-            grayscale_image = self.current_image.convert('L')
-            # 2. Створюємо масив NumPy вже з гарантовано правильного формату
-            img_array = np.array(grayscale_image, dtype=np.float64)
-            
-            # Застосування фільтрів Прюіта
-            prewitt_x = ndimage.convolve(img_array, self.predefined_filters['Prewitt X'])
-            prewitt_y = ndimage.convolve(img_array, self.predefined_filters['Prewitt Y'])
-            
-            # Обчислення градієнта (величина вектора градієнта)
-            gradient = np.sqrt(prewitt_x**2 + prewitt_y**2)
-            
-            # Нормалізація до діапазону 0-255
-            if np.max(gradient) > 0:
-                gradient = (255.0 * gradient / np.max(gradient)).astype(np.uint8)
-            else:
-                gradient = np.zeros_like(gradient, dtype=np.uint8)
-            
-            self.current_image = Image.fromarray(gradient)
-            self.display_processed_image()
-            self.update_image_info()
-            self.update_filter_matrix_display("Prewitt", [self.predefined_filters['Prewitt X'], self.predefined_filters['Prewitt Y']])
-            self.status_bar.config(text="Застосовано фільтр Прюіта")
-        except Exception as e:
-            messagebox.showerror("Помилка", f"Помилка при застосуванні фільтра Прюіта:\n{str(e)}")
-
+        kernels = [self.predefined_filters['Prewitt X'], self.predefined_filters['Prewitt Y']]
+        if self.apply_gradient_filter(*kernels, 'Прюіта'):
+            self.update_filter_matrix_display("Prewitt", kernels)
 
     def apply_sobel(self):
         """Застосування фільтра Собеля"""
-        if not self.current_image:
-            messagebox.showwarning("Увага", "Спочатку відкрийте зображення")
-            return
-        try:
-            # 1. Надійно конвертуємо зображення у напівтонове ('L' - Luminance)
-            grayscale_image = self.current_image.convert('L')
-            # 2. Створюємо масив NumPy вже з гарантовано правильного формату
-            img_array = np.array(grayscale_image, dtype=np.float64)
-            
-            # Застосування фільтрів Собеля
-            sobel_x = ndimage.convolve(img_array, self.predefined_filters['Sobel X'])
-            sobel_y = ndimage.convolve(img_array, self.predefined_filters['Sobel Y'])
-            
-            # Обчислення градієнта (величина вектора градієнта)
-            sobel = np.sqrt(sobel_x**2 + sobel_y**2)
-            
-            # Нормалізація до діапазону 0-255
-            if np.max(sobel) > 0:
-                sobel = (255.0 * sobel / np.max(sobel)).astype(np.uint8)
-            else:
-                sobel = np.zeros_like(sobel, dtype=np.uint8)
-            
-            self.current_image = Image.fromarray(sobel)
-            self.display_processed_image()
-            self.update_image_info()
-            self.update_filter_matrix_display("Sobel", [self.predefined_filters['Sobel X'], self.predefined_filters['Sobel Y']])
-            self.status_bar.config(text="Застосовано фільтр Собеля")
-        except Exception as e:
-            messagebox.showerror("Помилка", f"Помилка при застосуванні фільтра Собеля:\n{str(e)}")
+        kernels = [self.predefined_filters['Sobel X'], self.predefined_filters['Sobel Y']]
+        if self.apply_gradient_filter(*kernels, 'Собеля'):
+            self.update_filter_matrix_display("Sobel", kernels)
     
     def open_image(self):
         """Відкриття зображення"""
@@ -623,10 +523,14 @@ class ImageProcessor:
         
         if file_path:
             try:
-                # Завантаження зображення
+                # Завантаження зображення (лише заголовок, пікселі декодуються при першому фільтрі)
                 self.original_image = Image.open(file_path)
-                self.current_image = self.original_image.copy()
+                # Оброблене зображення спільно використовує пікселі оригіналу,
+                # доки якийсь фільтр не створить нове зображення
+                self.current_image = self.original_image
                 self.current_file_path = file_path
+                with stage('decode'):
+                    self.original_preview = open_preview(file_path, self._canvas_size(self.original_canvas))
                 
                 # Відображення зображення
                 self.display_original_image()
@@ -639,34 +543,79 @@ class ImageProcessor:
                 messagebox.showerror("Помилка", f"Не вдалося відкрити зображення:\n{str(e)}")
 
 
-    def _display_image_on_canvas(self, image_to_display, canvas, photo_image_attr):
-        """Відображає задане зображення на заданому Canvas."""
-        if not image_to_display:
-            return
-
-        # Отримання розмірів canvas після того, як вікно буде промальовано
-        self.root.update_idletasks() 
+    def _canvas_size(self, canvas):
+        """Повертає розміри canvas після того, як вікно буде промальовано."""
         canvas_width = canvas.winfo_width()
         canvas_height = canvas.winfo_height()
 
+        if canvas_width <= 1 or canvas_height <= 1:
+            # Розміри ще не обчислені - промальовуємо вікно лише в цьому випадку
+            self.root.update_idletasks()
+            canvas_width = canvas.winfo_width()
+            canvas_height = canvas.winfo_height()
+
         if canvas_width <= 1 or canvas_height <= 1:
             # Якщо canvas ще не має розміру, використовуємо тимчасовий
             canvas_width, canvas_height = 600, 600
+        return canvas_width, canvas_height
+
+    def _render_photo(self, image, size, resample, cache=True):
+        """Повертає PhotoImage зображення заданого розміру, використовуючи кеш.
+
+        Зображення PIL у програмі ніколи не змінюються на місці (кожен фільтр створює
+        новий об'єкт), тому ідентичність об'єкта слугує його версією. Слабке посилання
+        в записі кешу захищає від повторного використання id після видалення зображення.
+        cache=False - проміжна мініатюра (під час зміни розміру вікна): вона не
+        потрапляє в кеш і не витісняє з нього остаточні.
+        """
+        key = (id(image), size, resample)
+        entry = self.render_cache.get(key)
+        if entry is not None and entry[0]() is image:
+            self.render_cache.move_to_end(key)
+            return entry[1]
+
+        if size == image.size:
+            display_image = image
+        else:
+            source = image
+            # Незмінений оригінал масштабуємо з попередньо декодованої зменшеної копії,
+            # якщо вона не менша за потрібний розмір
+            if (image is self.original_image and self.original_preview is not None
+                    and self.original_preview.width >= size[0] and self.original_preview.height >= size[1]):
+                source = self.original_preview
+            with stage('render', source.size):
+                display_image = source.resize(size, resample)
+
+        with stage('render', size):
+            photo_image = ImageTk.PhotoImage(display_image)
+        if cache:
+            self.render_cache[key] = (weakref.ref(image), photo_image)
+            while len(self.render_cache) > self.render_cache_size:
+                self.render_cache.popitem(last=False)
+        return photo_image
+
+    def _display_image_on_canvas(self, image_to_display, canvas, photo_image_attr):
+        """Відображає задане зображення на заданому Canvas."""
+        if not image_to_display:
+            return
+
+        canvas_width, canvas_height = self._canvas_size(canvas)
 
+        # Розміри відомі з заголовка файлу, повне декодування для цього не потрібне
         img_width, img_height = image_to_display.size
         
         # Масштабування для вписування в canvas
         scale = min(canvas_width / img_width, canvas_height / img_height) * 0.98 # 0.98 для невеликих відступів
         
         if scale < 1.0: # Зменшуємо тільки якщо зображення більше за canvas
-             new_width = int(img_width * scale)
-             new_height = int(img_height * scale)
-             display_image = image_to_display.resize((new_width, new_height), Image.Resampling.LANCZOS)
+             display_size = (max(1, int(img_width * scale)), max(1, int(img_height * scale)))
         else:
-            display_image = image_to_display
+            display_size = image_to_display.size
        
-        # Конвертація в PhotoImage
-        photo_image = ImageTk.PhotoImage(display_image)
+        # Конвертація в PhotoImage (або готовий результат з кешу); швидкі проміжні
+        # мініатюри під час зміни розміру вікна не кешуються
+        final = self.display_resample == Image.Resampling.LANCZOS
+        photo_image = self._render_photo(image_to_display, display_size, self.display_resample, cache=final)
         setattr(self, photo_image_attr, photo_image) # Зберігаємо посилання!
 
         # Очищення canvas і відображення зображення
@@ -682,16 +631,69 @@ class ImageProcessor:
     def display_processed_image(self):
         """Відображає поточне (оброблене) зображення в правій панелі."""
         self._display_image_on_canvas(self.current_image, self.processed_canvas, 'processed_photo_image')
+        self.show_timings()
+
+    def _image_digest(self, image):
+        """Хеш вмісту зображення (обчислюється один раз для кожного об'єкта)."""
+        entry = self.image_digests.get(id(image))
+        if entry is not None and entry[0]() is image:
+            return entry[1]
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(FilterCache.array_digest(np.asarray(image)).encode())
+        digest.update(image.mode.encode())
+        # Для 'P'/'PA' пікселі - лише індекси: однакові індекси з різною палітрою
+        # чи прозорістю дають різні зображення
+        if image.palette is not None:
+            digest.update(image.palette.mode.encode())
+            digest.update(bytes(image.getpalette() or []))
+        if 'transparency' in image.info:
+            digest.update(repr(image.info['transparency']).encode())
+        digest = digest.hexdigest()
+        self._remember_digest(image, digest)
+        return digest
+
+    def _remember_digest(self, image, digest):
+        # Записи видаляються разом із зображенням
+        image_id = id(image)
+        self.image_digests[image_id] = (weakref.ref(image, lambda _: self.image_digests.pop(image_id, None)), digest)
+
+    def _apply_cached_filter(self, mode, kernel, compute):
+        """Робить поточним результат фільтра: з кешу або обчислений compute() і збережений у кеші."""
+        with stage('decode', self.current_image.size):
+            # Лінивий оригінал декодується тут (для вже завантажених зображень нічого не робить)
+            self.current_image.load()
+        with stage('hash', self.current_image.size):
+            key = self.filter_cache.make_key(self._image_digest(self.current_image), kernel, mode)
+        result = self.filter_cache.get(key)
+        if result is None:
+            result = self.filter_cache.put(key, compute())
+        with stage('to_pil', result.shape):
+            self.current_image = Image.fromarray(result)
+        # Результат однозначно визначається ключем, тому ключ і є хешем нового зображення -
+        # наступний фільтр не хешуватиме пікселі повторно
+        self._remember_digest(self.current_image, key)
+
+    def _on_canvas_resize(self, event=None):
+        """Під час зміни розміру вікна перемальовуємо швидким фільтром, а LANCZOS - після завершення."""
+        if self.original_image is None:
+            return
+        if self._resize_job is not None:
+            self.root.after_cancel(self._resize_job)
+        self.display_resample = Image.Resampling.BILINEAR
+        self.display_original_image()
+        self.display_processed_image()
+        self._resize_job = self.root.after(250, self._finish_resize)
+
+    def _finish_resize(self):
+        self._resize_job = None
+        self.display_resample = Image.Resampling.LANCZOS
+        self.display_original_image()
+        self.display_processed_image()
     
     def save_image(self):
         """Збереження зображення"""
-        if self.current_image and hasattr(self, 'current_file_path'):
-            try:
-                self.current_image.save(self.current_file_path)
-                self.status_bar.config(text=f"Збережено: {os.path.basename(self.current_file_path)}")
-                messagebox.showinfo("Успіх", "Зображення успішно збережено")
-            except Exception as e:
-                messagebox.showerror("Помилка", f"Не вдалося зберегти зображення:\n{str(e)}")
+        if self.current_image and self.current_file_path:
+            self._queue_save(self.current_file_path)
         else:
             self.save_image_as()
     
@@ -711,31 +713,40 @@ class ImageProcessor:
             )
             
             if file_path:
-                try:
-                    # Визначення формату за розширенням
-                    _, ext = os.path.splitext(file_path)
-                    ext = ext.lower()
-                    
-                    # Збереження з відповідним форматом
-                    if ext in ['.jpg', '.jpeg']:
-                        # Конвертація RGBA в RGB для JPEG
-                        if self.current_image.mode == 'RGBA':
-                            rgb_image = Image.new('RGB', self.current_image.size, (255, 255, 255))
-                            rgb_image.paste(self.current_image, mask=self.current_image.split()[3])
-                            rgb_image.save(file_path, 'JPEG', quality=95)
-                        else:
-                            self.current_image.save(file_path, 'JPEG', quality=95)
-                    else:
-                        self.current_image.save(file_path)
-                    
+                if self._queue_save(file_path):
                     self.current_file_path = file_path
-                    self.status_bar.config(text=f"Збережено: {os.path.basename(file_path)}")
-                    messagebox.showinfo("Успіх", "Зображення успішно збережено")
-                    
-                except Exception as e:
-                    messagebox.showerror("Помилка", f"Не вдалося зберегти зображення:\n{str(e)}")
         else:
             messagebox.showwarning("Увага", "Немає зображення для збереження")
+
+    def _queue_save(self, file_path):
+        """Передає поточне зображення у фоновий потік збереження."""
+        image = self.current_image
+        if image is self.original_image:
+            # Лінивий оригінал декодуємо тут: файл може бути перезаписаний, а PIL
+            # не дозволяє декодувати одне зображення з двох потоків одночасно
+            image.load()
+        # Зображення не змінюються на місці, тому копія для потоку не потрібна
+        if not self.saver.submit(image, file_path):
+            messagebox.showwarning("Увага", "Зачекайте: попередні зображення ще зберігаються")
+            return False
+        self.status_bar.config(text=f"Збереження (в черзі: {self.saver.pending}): {os.path.basename(file_path)}")
+        return True
+
+    def _poll_saves(self):
+        """Обробка подій фонового збереження в потоці GUI."""
+        try:
+            while True:
+                event, file_path, error = self.saver.events.get_nowait()
+                name = os.path.basename(file_path)
+                if event == 'start':
+                    self.status_bar.config(text=f"Кодування та запис (в черзі: {self.saver.pending}): {name}")
+                elif event == 'done':
+                    self.status_bar.config(text=f"Збережено: {name}")
+                else:
+                    messagebox.showerror("Помилка", f"Не вдалося зберегти зображення {name}:\n{str(error)}")
+        except queue.Empty:
+            pass
+        self.root.after(100, self._poll_saves)
     
     def convert_to_grayscale(self):
         """Перетворення зображення в напівтонове"""
@@ -759,7 +770,8 @@ class ImageProcessor:
     def restore_original(self):
         """Відновлення оригінального зображення"""
         if self.original_image:
-            self.current_image = self.original_image.copy()
+            # Зображення PIL не змінюються на місці, тому копія не потрібна
+            self.current_image = self.original_image
             self.display_processed_image()
             self.update_image_info()
             self.update_filter_matrix_display("Оригінал")
@@ -863,30 +875,14 @@ class ImageProcessor:
             return
         
         try:
-            # Спочатку застосовуємо низькочастотний фільтр Гауса
-            img_array = np.array(self.current_image)
-            
             # Великий фільтр Гауса для розмиття
+            gaussian_kernel = GAUSSIAN_HIGHPASS_KERNEL
 
-            gaussian_kernel = np.array([[1, 4, 7, 4, 1],
-                                       [4, 16, 26, 16, 4],
-                                       [7, 26, 41, 26, 7],
-                                       [4, 16, 26, 16, 4],
-                                       [1, 4, 7, 4, 1]]) / 273
-            
-            if len(img_array.shape) == 2:
-                blurred = ndimage.convolve(img_array, gaussian_kernel)
+            def compute():
                 # Високочастотний = Оригінал - Низькочастотний
-                highpass = img_array - blurred + 128
-            else:
-                blurred = np.zeros_like(img_array)
-                highpass = np.zeros_like(img_array)
-                for i in range(img_array.shape[2]):
-                    blurred[:, :, i] = ndimage.convolve(img_array[:, :, i], gaussian_kernel)
-                    highpass[:, :, i] = img_array[:, :, i] - blurred[:, :, i] + 128
-            
-            highpass = np.clip(highpass, 0, 255).astype(np.uint8)
-            self.current_image = Image.fromarray(highpass)
+                return gaussian_highpass(np.array(self.current_image))
+
+            self._apply_cached_filter('gaussian_highpass', gaussian_kernel, compute)
             self.display_processed_image()
             self.update_image_info()
             self.update_filter_matrix_display("Gaussian HighPass", gaussian_kernel)
@@ -902,22 +898,13 @@ class ImageProcessor:
             return
         
         try:
-            img_array = np.array(self.current_image)
-            
             # Інвертований фільтр Лапласа для згладжування
-            lowpass_kernel = np.array([[0, -1, 0],
-                                      [-1, 5, -1],
-                                      [0, -1, 0]]) / 1
-            
-            if len(img_array.shape) == 2:
-                filtered = ndimage.convolve(img_array.astype(float), lowpass_kernel)
-            else:
-                filtered = np.zeros_like(img_array, dtype=float)
-                for i in range(img_array.shape[2]):
-                    filtered[:, :, i] = ndimage.convolve(img_array[:, :, i].astype(float), lowpass_kernel)
-            
-            filtered = np.clip(filtered, 0, 255).astype(np.uint8)
-            self.current_image = Image.fromarray(filtered)
+            lowpass_kernel = LAPLACIAN_LOWPASS_KERNEL
+
+            def compute():
+                return laplacian_lowpass(np.array(self.current_image))
+
+            self._apply_cached_filter('laplacian_lowpass', lowpass_kernel, compute)
             self.display_processed_image()
             self.update_image_info()
             self.update_filter_matrix_display("Laplacian LowPass", lowpass_kernel)
@@ -1012,6 +999,20 @@ class ImageProcessor:
         ttk.Button(button_frame, text="Застосувати", command=apply_selected).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Скасувати", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
     
+    def show_comparison(self):
+        """Вікно порівняння оригінального та обробленого зображень"""
+        if not self.original_image or not self.current_image:
+            messagebox.showwarning("Увага", "Спочатку відкрийте зображення")
+            return
+
+        compare_window = tk.Toplevel(self.root)
+        compare_window.title("Порівняння зображень")
+        compare_window.geometry("1150x650")
+
+        left_canvas = tk.Canvas(compare_window, width=550, height=600, bg="gray85")
+        left_canvas.pack(side=tk.LEFT, padx=10, pady=10)
+        right_canvas = tk.Canvas(compare_window, width=550, height=600, bg="gray85")
+        right_canvas.pack(side=tk.RIGHT, padx=10, pady=10)
    
         # Масштабування і відображення зображень
         def display_comparison():
@@ -1029,15 +1030,13 @@ class ImageProcessor:
             new_width = int(img_width * scale)
             new_height = int(img_height * scale)
             
-            # Відображення оригіналу
-            original_resized = self.original_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            original_photo = ImageTk.PhotoImage(original_resized)
+            # Відображення оригіналу (мініатюри беруться з того ж кешу, що й основні панелі)
+            original_photo = self._render_photo(self.original_image, (new_width, new_height), Image.Resampling.LANCZOS)
             left_canvas.create_image(canvas_width // 2, canvas_height // 2, anchor=tk.CENTER, image=original_photo)
             left_canvas.image = original_photo  # Зберігаємо посилання
             
             # Відображення обробленого
-            current_resized = self.current_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            current_photo = ImageTk.PhotoImage(current_resized)
+            current_photo = self._render_photo(self.current_image, (new_width, new_height), Image.Resampling.LANCZOS)
             right_canvas.create_image(canvas_width // 2, canvas_height // 2, anchor=tk.CENTER, image=current_photo)
             right_canvas.image = current_photo  # Зберігаємо посилання
         
@@ -1107,6 +1106,8 @@ def main():
     root.geometry(f'{width}x{height}+{x}+{y}')
     
     root.mainloop()
+    # Дочекатися незавершених фонових збережень
+    app.saver.close()
 
 
 if __name__ == "__main__":
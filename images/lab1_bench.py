@@ -0,0 +1,220 @@
+"""Бенчмарк фільтрів lab1 без GUI.
+
+Для кожного фільтра (apply_custom_kernel, apply_gradient_filter,
+apply_gaussian_highpass, apply_laplacian_lowpass), розміру зображення,
+кількості каналів, розміру ядра та способу згортки (direct, separable, fft)
+вимірюються час, пропускна здатність і пікова пам'ять процесу. Кожен випадок
+виконується в окремому процесі, щоб пікова пам'ять (ru_maxrss) не
+накопичувалася між випадками.
+
+Запуск:
+    python lab1_bench.py --sizes 512 2048 --kernels 3 9 31
+    python lab1_bench.py --image lab_2/image.png --csv results.csv
+    python lab1_bench.py --import-time
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import lab1_filters as filters
+
+
+DEFAULT_SIZES = (512, 1024, 2048, 4096, 8192)
+DEFAULT_KERNELS = (3, 7, 15, 31)
+
+
+def gaussian_kernel(size):
+    """Сепарабельне ядро Гауса size×size (сума = 1)."""
+    x = np.arange(size) - size // 2
+    g = np.exp(-x**2 / (2 * (size / 6.0) ** 2))
+    kernel = np.outer(g, g)
+    return kernel / kernel.sum()
+
+
+def edge_kernel(size):
+    """Несепарабельне ядро контурів size×size: -1 навколо, центр = кількість сусідів."""
+    kernel = -np.ones((size, size))
+    kernel[size // 2, size // 2] = size * size - 1
+    return kernel
+
+
+def make_image(size, channels, image_path=None):
+    """Синтетичне (шум + градієнт) або масштабоване зразкове зображення."""
+    if image_path:
+        from PIL import Image
+        img = Image.open(image_path).convert('L' if channels == 1 else 'RGB')
+        return np.array(img.resize((size, size), Image.Resampling.BILINEAR))
+    rng = np.random.default_rng(0)
+    shape = (size, size) if channels == 1 else (size, size, channels)
+    ramp = np.linspace(0, 128, size)[None, :]
+    if channels > 1:
+        ramp = ramp[:, :, None]
+    return np.clip(rng.integers(0, 128, shape) + ramp, 0, 255).astype(np.uint8)
+
+
+def run_filter(name, img_array, kernel_size, engine):
+    """Викликає фільтр за назвою з тими самими функціями, що й GUI."""
+    if name == 'kernel:gaussian':
+        return filters.apply_kernel(img_array, gaussian_kernel(kernel_size), engine)
+    if name == 'kernel:edge':
+        return filters.apply_kernel(img_array, edge_kernel(kernel_size), engine)
+    if name == 'gradient':
+        return filters.apply_gradient(img_array, filters.PREDEFINED_FILTERS['Sobel X'],
+                                      filters.PREDEFINED_FILTERS['Sobel Y'], engine)
+    if name == 'gaussian_highpass':
+        return filters.gaussian_highpass(img_array, engine)
+    if name == 'laplacian_lowpass':
+        return filters.laplacian_lowpass(img_array, engine)
+    raise ValueError(f"Невідомий фільтр: {name}")
+
+
+# Фільтри з фіксованим ядром вимірюються лише для одного розміру ядра
+FIXED_KERNELS = {'gradient': 3, 'gaussian_highpass': 5, 'laplacian_lowpass': 3}
+FILTERS = ('kernel:gaussian', 'kernel:edge') + tuple(FIXED_KERNELS)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss у Linux - кілобайти
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_case(case):
+    """Один випадок бенчмарку (виконується в окремому процесі)."""
+    name, size, channels, kernel_size, engine, repeats, image_path = case
+    img_array = make_image(size, channels, image_path)
+    # Прогрів на маленькому фрагменті: ліниві імпорти (scipy.signal) не потрапляють у вимір
+    run_filter(name, img_array[:64, :64], kernel_size, engine)
+    baseline_rss = _peak_rss_mb()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = run_filter(name, img_array, kernel_size, engine)
+        times.append(time.perf_counter() - start)
+
+    max_diff = 0
+    if engine != 'direct':
+        reference = run_filter(name, img_array, kernel_size, 'direct')
+        max_diff = int(np.max(np.abs(result.astype(np.int16) - reference.astype(np.int16))))
+
+    peak_rss = _peak_rss_mb()
+    best = min(times)
+    return {
+        'filter': name,
+        'size': size,
+        'channels': channels,
+        'kernel': kernel_size,
+        'engine': engine,
+        'time_ms': best * 1000.0,
+        'mpix_per_s': size * size / best / 1e6,
+        'peak_rss_mb': peak_rss,
+        'extra_rss_mb': None if peak_rss is None else peak_rss - baseline_rss,
+        'max_diff': max_diff,
+    }
+
+
+def measure_import_time(module, repeats=5):
+    """Холодний імпорт модуля в новому інтерпретаторі: (мінімальний час у мс, чи імпортовано scipy)."""
+    code = (f"import sys, time; start = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - start, 'scipy' in sys.modules)")
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        times.append(float(output[0]) * 1000.0)
+    return min(times), output[1] == 'True'
+
+
+def build_cases(filter_names, sizes, channel_counts, kernel_sizes, engines, repeats, image_path):
+    cases = []
+    for name in filter_names:
+        for size in sizes:
+            for channels in channel_counts:
+                for kernel_size in ([FIXED_KERNELS[name]] if name in FIXED_KERNELS else kernel_sizes):
+                    for engine in engines:
+                        cases.append((name, size, channels, kernel_size, engine, repeats, image_path))
+    return cases
+
+
+def format_table(results):
+    """Таблиця порівняння: для кожного випадку - усі способи згортки поруч."""
+    header = f"{'фільтр':<18} {'розмір':>6} {'кан':>3} {'ядро':>5} {'спосіб':<10} {'мс':>10} {'МПікс/с':>9} {'RSS МБ':>8} {'+RSS МБ':>8} {'Δ':>4}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        rss = '-' if r['peak_rss_mb'] is None else f"{r['peak_rss_mb']:.0f}"
+        extra = '-' if r['extra_rss_mb'] is None else f"{r['extra_rss_mb']:.0f}"
+        lines.append(f"{r['filter']:<18} {r['size']:>6} {r['channels']:>3} {r['kernel']:>5} {r['engine']:<10} "
+                     f"{r['time_ms']:>10.1f} {r['mpix_per_s']:>9.1f} {rss:>8} {extra:>8} {r['max_diff']:>4}")
+    return '\n'.join(lines)
+
+
+def fastest_engines(results):
+    """Найшвидший спосіб згортки для кожного фільтра, розміру, каналів і ядра."""
+    best = {}
+    for r in results:
+        key = (r['filter'], r['size'], r['channels'], r['kernel'])
+        if key not in best or r['time_ms'] < best[key]['time_ms']:
+            best[key] = r
+    return [f"{k[0]:<18} {k[1]:>6} {k[2]:>3} {k[3]:>5}  -> {v['engine']}" for k, v in sorted(best.items())]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк фільтрів lab1 без GUI")
+    parser.add_argument('--filters', nargs='+', default=list(FILTERS), choices=FILTERS)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--channels', type=int, nargs='+', default=[1, 3], help="1 - напівтонове, 3 - RGB")
+    parser.add_argument('--kernels', type=int, nargs='+', default=list(DEFAULT_KERNELS))
+    parser.add_argument('--engines', nargs='+', default=list(filters.ENGINES), choices=filters.ENGINES)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--image', help="Зразкове зображення замість синтетичного")
+    parser.add_argument('--csv', help="Зберегти результати у CSV")
+    parser.add_argument('--import-time', action='store_true',
+                        help="Лише виміряти час холодного імпорту lab1_filters і lab1")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        for module in ('lab1_filters', 'lab1'):
+            elapsed, scipy_loaded = measure_import_time(module)
+            print(f"import {module}: {elapsed:.1f} мс (scipy {'імпортовано' if scipy_loaded else 'не імпортовано'})")
+        return
+
+    cases = build_cases(args.filters, args.sizes, args.channels, args.kernels, args.engines,
+                        args.repeats, args.image)
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        # Новий процес на кожен випадок - чиста пікова пам'ять
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        print(f"{result['filter']} {result['size']}² ×{result['channels']} k={result['kernel']} "
+              f"{result['engine']}: {result['time_ms']:.1f} мс", flush=True)
+
+    print()
+    print(format_table(results))
+    print()
+    print("Найшвидший спосіб:")
+    print('\n'.join(fastest_engines(results)))
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
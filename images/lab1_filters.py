@@ -0,0 +1,619 @@
+"""Просторова фільтрація зображень без GUI.
+
+Ті самі фільтри, що й у lab1.py, але над масивами NumPy: функції приймають
+і повертають масиви, не залежать від tkinter/PIL і можуть виконуватися
+в пулі процесів. scipy імпортується лише при першій згортці. Для дуже великих
+зображень (TIFF, .npy або сирі дані) є потоковий режим: джерело читається
+смугами рядків з перекриттям на радіус ядра, кожна смуга згортається окремо
+і відразу записується у вихідний файл, тому пам'ять обмежена розміром смуги.
+
+Необов'язкові залежності потокового режиму: tifffile (читання і запис TIFF)
+та zarr (стиснені або тайлові TIFF). Вони імпортуються лише для відповідних
+файлів; якщо пакета немає, помилка називає, що саме встановити.
+
+Запуск з командного рядка:
+    python lab1_filters.py scan.tif result.tif --filter Sobel --strip-height 256
+"""
+import argparse
+import hashlib
+import importlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import lab1_trace
+from lab1_trace import stage
+
+
+# --- Попередньо визначені фільтри ---
+
+PREDEFINED_FILTERS = {
+    'Laplace': np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]]),
+    'Hipass': np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]]),
+    'Edge detection': np.array([[-1, -1, -1], [-1, 8, -1], [-1, -1, -1]]),
+    'Sharpen': np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]]),
+    'Softening': np.array([[1, 1, 1], [1, 1, 1], [1, 1, 1]]) / 9,  # Виправлено: правильна нормалізація
+    'Gaussian 3x3': np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]]) / 16,
+    'Gaussian 5x5': np.array([[1, 4, 6, 4, 1],
+                              [4, 16, 24, 16, 4],
+                              [6, 24, 36, 24, 6],
+                              [4, 16, 24, 16, 4],
+                              [1, 4, 6, 4, 1]]) / 256,
+    'Prewitt X': np.array([[-1, 0, 1], [-1, 0, 1], [-1, 0, 1]]),
+    'Prewitt Y': np.array([[1, 1, 1], [0, 0, 0], [-1, -1, -1]]),
+    'Sobel X': np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]]),
+    'Sobel Y': np.array([[1, 2, 1], [0, 0, 0], [-1, -2, -1]])
+}
+
+# Градієнтні фільтри: величина вектора з двох ядер
+GRADIENT_FILTERS = {
+    'Prewitt': ('Prewitt X', 'Prewitt Y'),
+    'Sobel': ('Sobel X', 'Sobel Y'),
+}
+
+# Великий фільтр Гауса для високочастотного фільтра (Оригінал - Низькочастотний)
+GAUSSIAN_HIGHPASS_KERNEL = np.array([[1, 4, 7, 4, 1],
+                                     [4, 16, 26, 16, 4],
+                                     [7, 26, 41, 26, 7],
+                                     [4, 16, 26, 16, 4],
+                                     [1, 4, 7, 4, 1]]) / 273
+
+# Інвертований фільтр Лапласа для згладжування
+LAPLACIAN_LOWPASS_KERNEL = np.array([[0, -1, 0],
+                                     [-1, 5, -1],
+                                     [0, -1, 0]]) / 1
+
+# Способи згортки: пряма (ndimage), сепарабельна (два одновимірні проходи
+# для ядер рангу 1) та через FFT. Для ядер, які спосіб не підтримує,
+# використовується пряма згортка.
+ENGINES = ('direct', 'separable', 'fft')
+
+
+# --- Обробка масивів ---
+
+def _ndimage():
+    """scipy.ndimage імпортується ліниво: сам імпорт scipy займає більше часу, ніж цей модуль."""
+    from scipy import ndimage
+    return ndimage
+
+
+def is_edge_kernel(kernel):
+    """Ядро з від'ємними значеннями (Sobel, Laplace...) - фільтр виділення контурів."""
+    return bool(np.any(np.asarray(kernel) < 0))
+
+
+def to_luminance(img_array):
+    """Напівтонове зображення з тим самим округленням, що й Image.convert('L') у PIL."""
+    if img_array.ndim == 2:
+        return img_array
+    if img_array.shape[2] < 3:
+        # 'LA' - беремо канал яскравості, альфа-канал відкидаємо
+        return img_array[:, :, 0]
+    rgb = img_array[:, :, :3].astype(np.uint32)
+    luminance = (rgb[:, :, 0] * 19595 + rgb[:, :, 1] * 38470 + rgb[:, :, 2] * 7471 + 0x8000) >> 16
+    return luminance.astype(np.uint8)
+
+
+def separable_factors(kernel, tolerance=1e-10):
+    """Розклад ядра рангу 1 на стовпець і рядок (через SVD) або None."""
+    kernel = np.asarray(kernel, dtype=np.float64)
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or (len(s) > 1 and s[1] > tolerance * s[0]):
+        return None
+    return u[:, 0] * np.sqrt(s[0]), vt[0] * np.sqrt(s[0])
+
+
+def convolve2d(channel, kernel, engine='direct'):
+    """Згортка одного каналу обраним способом з межами 'reflect', як у ndimage.convolve.
+
+    FFT-згортка може відрізнятися від прямої на похибку округлення float,
+    тому після відсікання до uint8 окремі пікселі можуть відрізнятися на 1.
+    """
+    odd = kernel.shape[0] % 2 == 1 and kernel.shape[1] % 2 == 1
+    if engine == 'separable' and odd:
+        factors = separable_factors(kernel)
+        if factors is not None:
+            column, row = factors
+            ndimage = _ndimage()
+            return ndimage.convolve1d(ndimage.convolve1d(channel, column, axis=0), row, axis=1)
+    elif engine == 'fft' and odd:
+        from scipy.signal import fftconvolve
+        pad_y, pad_x = kernel.shape[0] // 2, kernel.shape[1] // 2
+        # Режим 'reflect' у ndimage відповідає 'symmetric' у np.pad
+        padded = np.pad(channel, ((pad_y, pad_y), (pad_x, pad_x)), mode='symmetric')
+        return fftconvolve(padded, kernel, mode='valid')
+    elif engine not in ENGINES:
+        raise ValueError(f"Невідомий спосіб згортки: {engine}")
+    return _ndimage().convolve(channel, kernel)
+
+
+def convolve_channels(img_array, kernel, engine='direct'):
+    """Згортка кожного каналу окремо (результат у float64)."""
+    with stage('float', img_array.shape):
+        img_array = np.asarray(img_array, dtype=np.float64)
+    with stage('convolve', img_array.shape, kernel.shape):
+        if img_array.ndim == 2:
+            return convolve2d(img_array, kernel, engine)
+        filtered = np.zeros_like(img_array, dtype=np.float64)
+        for i in range(img_array.shape[2]):
+            filtered[:, :, i] = convolve2d(img_array[:, :, i], kernel, engine)
+        return filtered
+
+
+def filter_response(img_array, kernel, engine='direct'):
+    """Відгук фільтра до нормалізації.
+
+    Для фільтрів контурів - абсолютна величина згортки яскравості,
+    для інших - згортка кожного каналу.
+    """
+    if is_edge_kernel(kernel):
+        return np.abs(convolve_channels(to_luminance(img_array), kernel, engine))
+    return convolve_channels(img_array, kernel, engine)
+
+
+def gradient_response(img_array, kernel_x, kernel_y, engine='direct'):
+    """Величина вектора градієнта для пари ядер (Prewitt, Sobel)."""
+    with stage('float', img_array.shape):
+        luminance = np.asarray(to_luminance(img_array), dtype=np.float64)
+    with stage('convolve', luminance.shape, kernel_x.shape):
+        grad_x = convolve2d(luminance, kernel_x, engine)
+        grad_y = convolve2d(luminance, kernel_y, engine)
+        return np.sqrt(grad_x**2 + grad_y**2)
+
+
+def response_upper_bound(kernel):
+    """Верхня межа |відгуку| ядра для вхідних значень 0-255."""
+    return 255.0 * float(np.sum(np.abs(kernel)))
+
+
+# --- Нормалізація фільтрів контурів ---
+# Нормалізація розділена на два етапи: редукцію (максимум або процентиль за
+# тайлами, EdgeStats) та масштабування (scale_response). Так смуги, тайли чи
+# паралельні задачі дають той самий результат, що й обробка всього зображення,
+# без зберігання повного відгуку у float.
+
+class EdgeStats:
+    """Часткова статистика відгуку фільтра контурів для глобальної нормалізації.
+
+    Зберігає максимум, а якщо задано percentile - ще й гістограму значень
+    у діапазоні [0, bound), з якої процентиль визначається з точністю
+    bound / bins. Межа bound - степінь двійки: початкова береться з
+    upper_bound (якщо відома) або з максимуму першого тайла і подвоюється
+    (з об'єднанням сусідніх кошиків), щойно відгук її перевищить. Тож вхідні
+    значення не мусять бути в 0-255, а статистики тайлів з різними межами
+    точно об'єднуються через merge.
+    """
+
+    def __init__(self, upper_bound=None, percentile=None, bins=65536):
+        self.percentile = percentile
+        self.bins = bins
+        self.bound = self._power_of_two(upper_bound) if upper_bound else None
+        self.max_value = 0.0
+        self.histogram = np.zeros(bins, dtype=np.int64) if percentile is not None else None
+
+    @staticmethod
+    def _power_of_two(value):
+        return float(2.0 ** np.ceil(np.log2(max(float(value), 1e-12))))
+
+    def _grow_to(self, bound):
+        """Подвоєння межі, доки вона не стане bound: кожні два кошики об'єднуються в один."""
+        while self.bound < bound:
+            half = self.histogram.reshape(-1, 2).sum(axis=1)
+            self.histogram[:] = 0
+            self.histogram[:len(half)] = half
+            self.bound *= 2
+
+    def update(self, response):
+        """Додає відгук одного тайла."""
+        if response.size == 0:
+            return self
+        tile_max = float(np.max(response))
+        self.max_value = max(self.max_value, tile_max)
+        if self.histogram is not None:
+            if self.bound is None:
+                self.bound = self._power_of_two(tile_max)
+            elif tile_max > self.bound:
+                self._grow_to(self._power_of_two(tile_max))
+            indices = (response * (self.bins / self.bound)).astype(np.int64)
+            np.minimum(indices, self.bins - 1, out=indices)
+            self.histogram += np.bincount(indices.ravel(), minlength=self.bins)
+        return self
+
+    def merge(self, other):
+        """Об'єднує статистику іншого тайла (для паралельної обробки)."""
+        self.max_value = max(self.max_value, other.max_value)
+        if self.histogram is not None and other.bound is not None:
+            if self.bound is None:
+                self.bound = other.bound
+            self._grow_to(other.bound)
+            histogram, bound = other.histogram, other.bound
+            while bound < self.bound:
+                histogram = np.concatenate([histogram.reshape(-1, 2).sum(axis=1),
+                                            np.zeros(self.bins // 2, dtype=np.int64)])
+                bound *= 2
+            self.histogram += histogram
+        return self
+
+    def scale_value(self):
+        """Значення, яке відображається в 255: максимум або процентиль."""
+        if self.histogram is None:
+            return self.max_value
+        cumulative = np.cumsum(self.histogram)
+        if cumulative[-1] == 0:
+            return 0.0
+        index = int(np.searchsorted(cumulative, cumulative[-1] * self.percentile / 100.0))
+        return min(self.max_value, (index + 1) * self.bound / self.bins)
+
+
+def scale_response(response, scale_value):
+    """Розтягування відгуку фільтра контурів до 0-255 (значення вище scale_value стають 255)."""
+    if scale_value > 0:
+        return np.minimum(255.0 * response / scale_value, 255.0).astype(np.uint8)
+    return np.zeros_like(response, dtype=np.uint8)
+
+
+def normalize_response(response, upper_bound=None, percentile=None):
+    """Нормалізація відгуку, що вже повністю в пам'яті: редукція за одним тайлом і масштабування."""
+    with stage('normalize', response.shape):
+        stats = EdgeStats(upper_bound, percentile).update(response)
+        return scale_response(response, stats.scale_value())
+
+
+def clip_response(response):
+    """Для фільтрів розмиття просто обрізаємо значення до 0-255."""
+    with stage('normalize', response.shape):
+        return np.clip(response, 0, 255).astype(np.uint8)
+
+
+# --- Фільтри над цілим масивом (масив uint8 -> масив uint8) ---
+
+def apply_kernel(img_array, kernel, engine='direct'):
+    """Довільне ядро: фільтри контурів нормалізуються до 0-255, інші обрізаються."""
+    kernel = np.asarray(kernel)
+    response = filter_response(img_array, kernel, engine)
+    if is_edge_kernel(kernel):
+        return normalize_response(response, response_upper_bound(kernel))
+    return clip_response(response)
+
+
+def apply_gradient(img_array, kernel_x, kernel_y, engine='direct'):
+    """Величина градієнта, нормалізована до 0-255."""
+    return normalize_response(gradient_response(img_array, kernel_x, kernel_y, engine))
+
+
+def gaussian_highpass(img_array, engine='direct'):
+    """Високочастотний фільтр: Оригінал - Гаус + 128.
+
+    Як і в GUI, розмиття та різниця обчислюються в типі вхідного масиву
+    (для uint8 - з відкиданням дробової частини та переповненням).
+    """
+    blurred = convolve_channels(img_array, GAUSSIAN_HIGHPASS_KERNEL, engine).astype(img_array.dtype)
+    highpass = img_array - blurred + 128
+    return np.clip(highpass, 0, 255).astype(np.uint8)
+
+
+def laplacian_lowpass(img_array, engine='direct'):
+    """Згладжування інвертованим фільтром Лапласа."""
+    return clip_response(convolve_channels(img_array, LAPLACIAN_LOWPASS_KERNEL, engine))
+
+
+def resolve_filter(filter_name):
+    """Повертає (функцію відгуку, розмір ядра, чи потрібна нормалізація, верхню межу відгуку)."""
+    if filter_name in GRADIENT_FILTERS:
+        kernel_x, kernel_y = (PREDEFINED_FILTERS[name] for name in GRADIENT_FILTERS[filter_name])
+        upper_bound = float(np.hypot(response_upper_bound(kernel_x), response_upper_bound(kernel_y)))
+        return (lambda arr: gradient_response(arr, kernel_x, kernel_y)), kernel_x.shape[0], True, upper_bound
+    if filter_name in PREDEFINED_FILTERS:
+        kernel = PREDEFINED_FILTERS[filter_name]
+        return ((lambda arr: filter_response(arr, kernel)), kernel.shape[0], is_edge_kernel(kernel),
+                response_upper_bound(kernel))
+    raise ValueError(f"Невідомий фільтр: {filter_name}")
+
+
+def _output_shape(source_shape, normalize):
+    if normalize or len(source_shape) == 2:
+        return tuple(source_shape[:2])
+    return tuple(source_shape[:3])
+
+
+# --- Кеш результатів фільтрації ---
+
+class FilterCache:
+    """LRU-кеш результатів фільтрів: (хеш вхідних даних, байти ядра, режим) -> масив.
+
+    Розмір кешу обмежується сумарним обсягом масивів у байтах. Якщо задано
+    cache_dir, результати також зберігаються на диск як .npy і переживають
+    перезапуск програми; дисковий кеш обмежується так само, за часом доступу.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, cache_dir=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def array_digest(img_array):
+        """Хеш вмісту масиву разом з його формою і типом."""
+        img_array = np.ascontiguousarray(img_array)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{img_array.shape}{img_array.dtype}".encode())
+        digest.update(memoryview(img_array).cast('B'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(input_digest, kernel, mode):
+        """Ключ кешу з хешу вхідних даних, ядра (або кількох ядер) і режиму фільтра."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(input_digest.encode())
+        digest.update(mode.encode())
+        kernels = kernel if isinstance(kernel, (list, tuple)) else [kernel]
+        for k in kernels:
+            k = np.asarray(k, dtype=np.float64)
+            digest.update(str(k.shape).encode())
+            digest.update(k.tobytes())
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Результат з кешу або None."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                result = np.load(path)
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            except (OSError, ValueError):
+                # Пошкоджений запис (напр. від старої версії без атомарного запису) - промах
+                self._remove(path)
+                return None
+            self._remember(key, result)
+            return result
+        return None
+
+    def put(self, key, result):
+        """Зберігає результат (масив стає лише для читання, щоб його не змінили через кеш)."""
+        result = np.ascontiguousarray(result)
+        result.flags.writeable = False
+        self._remember(key, result)
+        if self.cache_dir:
+            self._save_to_disk(key, result)
+            self._trim_disk()
+        return result
+
+    def _save_to_disk(self, key, result):
+        """Атомарний запис: читач бачить або повний .npy, або жодного."""
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', prefix=f'.{key}-', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, result)
+            os.replace(temp_path, self._disk_path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def _remember(self, key, result):
+        if result.nbytes > self.max_bytes:
+            return
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key).nbytes
+        self.entries[key] = result
+        self.total_bytes += result.nbytes
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+
+    def _trim_disk(self):
+        files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.npy')]
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+            if total <= self.max_disk_bytes:
+                break
+            total -= entry.stat().st_size
+            self._remove(entry.path)
+
+
+# --- Потокова обробка смугами ---
+
+def require(module_name, purpose):
+    """Імпорт необов'язкової залежності; без неї - ImportError з назвою пакета."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise ImportError(f"{purpose} потрібен пакет {module_name} (pip install {module_name})") from None
+
+
+class To8Bit:
+    """Джерело з беззнаковими цілими понад 8 біт (uint16...), що читається як uint8.
+
+    Значення масштабуються з повного діапазону типу (старші 8 біт) під час
+    читання кожної смуги, тож усе джерело в пам'ять не завантажується.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.ndim = data.ndim
+        self.dtype = np.dtype(np.uint8)
+        self.shift = data.dtype.itemsize * 8 - 8
+
+    def __getitem__(self, index):
+        return (np.asarray(self.data[index]) >> self.shift).astype(np.uint8)
+
+
+def check_source(data):
+    """Перевірка форми і типу джерела: uint8 без змін, інші беззнакові цілі - через To8Bit."""
+    if data.ndim not in (2, 3):
+        raise ValueError(f"Очікувалось зображення (висота, ширина[, канали]), отримано форму {data.shape}")
+    if data.dtype == np.uint8:
+        return data
+    if np.issubdtype(data.dtype, np.unsignedinteger):
+        return To8Bit(data)
+    raise ValueError(f"Підтримуються лише беззнакові цілі зображення (uint8, uint16...), отримано {data.dtype}")
+
+
+def open_source(path, raw_shape=None, raw_dtype='uint8'):
+    """Відкриває джерело без читання пікселів у пам'ять.
+
+    .npy - через np.load(mmap_mode='r'), TIFF - через tifffile.memmap
+    (або zarr-сховище tifffile для стиснених/тайлових TIFF), інші файли
+    вважаються сирими даними розміру raw_shape. Джерела понад 8 біт
+    читаються як uint8 (див. To8Bit), інші типи відхиляються.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        data = np.load(path, mmap_mode='r')
+    elif ext in ('.tif', '.tiff'):
+        tifffile = require('tifffile', "Для читання TIFF")
+        try:
+            data = tifffile.memmap(path, mode='r')
+        except ValueError:
+            # Стиснений або тайловий TIFF: декодуються лише потрібні смуги/тайли
+            zarr = require('zarr', "Для стиснених або тайлових TIFF")
+            data = zarr.open(tifffile.imread(path, aszarr=True), mode='r')
+    elif raw_shape is None:
+        raise ValueError("Для сирих даних потрібно вказати розмір (--raw-shape)")
+    else:
+        data = np.memmap(path, dtype=raw_dtype, mode='r', shape=tuple(raw_shape))
+    return check_source(data)
+
+
+def create_output(path, shape):
+    """Створює вихідний файл uint8 заданого розміру, відображений у пам'ять."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+    if ext in ('.tif', '.tiff'):
+        tifffile = require('tifffile', "Для запису TIFF")
+        photometric = 'minisblack' if len(shape) == 2 else 'rgb'
+        return tifffile.memmap(path, shape=shape, dtype=np.uint8, photometric=photometric)
+    return np.memmap(path, dtype=np.uint8, mode='w+', shape=shape)
+
+
+def iter_strips(height, strip_height, pad):
+    """Смуги рядків: (початок і кінець з перекриттям, початок і кінець корисної частини)."""
+    for y0 in range(0, height, strip_height):
+        y1 = min(y0 + strip_height, height)
+        yield max(0, y0 - pad), min(height, y1 + pad), y0, y1
+
+
+def _strip_response(source, response_fn, read0, read1, y0, y1):
+    """Відгук фільтра для однієї смуги без рядків перекриття."""
+    strip = np.asarray(source[read0:read1])
+    return response_fn(strip)[y0 - read0:y1 - read0]
+
+
+def filter_strips(source, output, filter_name, strip_height=512, percentile=None, max_workers=None):
+    """Фільтрація джерела смугами рядків із записом кожної смуги прямо в output.
+
+    Для фільтрів контурів нормалізація потребує глобальної статистики, тому
+    виконуються два проходи: перший збирає EdgeStats кожної смуги (максимум
+    або процентиль) і об'єднує їх, другий заново обчислює відгук смуг і
+    масштабує його. Смуги обробляються в пулі потоків (згортка scipy відпускає
+    GIL); повний відгук у float не зберігається, а результат збігається з
+    нормалізацією всього зображення.
+    """
+    response_fn, kernel_size, normalize, upper_bound = resolve_filter(filter_name)
+    # Перекриття на радіус ядра: згортка в корисній частині смуги не бачить її меж,
+    # а на краях зображення межа смуги збігається з межею зображення (режим 'reflect')
+    strips = list(iter_strips(source.shape[0], max(1, int(strip_height)), kernel_size // 2))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        scale_value = None
+        if normalize:
+            def strip_stats(bounds):
+                response = _strip_response(source, response_fn, *bounds)
+                return EdgeStats(upper_bound, percentile).update(response)
+
+            stats = EdgeStats(upper_bound, percentile)
+            for partial in pool.map(strip_stats, strips):
+                stats.merge(partial)
+            scale_value = stats.scale_value()
+
+        def write_strip(bounds):
+            read0, read1, y0, y1 = bounds
+            response = _strip_response(source, response_fn, *bounds)
+            output[y0:y1] = scale_response(response, scale_value) if normalize else clip_response(response)
+
+        list(pool.map(write_strip, strips))
+    return output
+
+
+def filter_tiled(img_array, filter_name, tile_height=512, percentile=None, max_workers=None):
+    """Фільтрація масиву в пам'яті смугами, паралельно в пулі потоків."""
+    source = check_source(np.asarray(img_array))
+    _, _, normalize, _ = resolve_filter(filter_name)
+    output = np.empty(_output_shape(source.shape, normalize), dtype=np.uint8)
+    return filter_strips(source, output, filter_name, tile_height, percentile, max_workers)
+
+
+def stream_filter(src_path, dst_path, filter_name, strip_height=512, raw_shape=None, raw_dtype='uint8',
+                  percentile=None, max_workers=None):
+    """Фільтрація файлу смугами рядків із записом результату прямо у вихідний файл.
+
+    Пікова пам'ять визначається висотою смуги × шириною зображення × кількістю
+    потоків. Результат збігається з обробкою всього зображення в пам'яті.
+    """
+    source = open_source(src_path, raw_shape, raw_dtype)
+    _, _, normalize, _ = resolve_filter(filter_name)
+    out_shape = _output_shape(source.shape, normalize)
+    output = create_output(dst_path, out_shape)
+    filter_strips(source, output, filter_name, strip_height, percentile, max_workers)
+    output.flush()
+    del output
+    return out_shape
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Потокова фільтрація великих зображень смугами рядків")
+    parser.add_argument('source', help="Вхідний файл (.tif, .npy або сирі дані)")
+    parser.add_argument('output', help="Вихідний файл (.tif, .npy або сирі дані)")
+    parser.add_argument('--filter', default='Laplace',
+                        choices=list(PREDEFINED_FILTERS) + list(GRADIENT_FILTERS))
+    parser.add_argument('--strip-height', type=int, default=512, help="Висота смуги в рядках")
+    parser.add_argument('--raw-shape', type=int, nargs='+', help="Розмір сирих даних: висота ширина [канали]")
+    parser.add_argument('--raw-dtype', default='uint8',
+                        help="Тип сирих даних (uint8 або ширший беззнаковий, напр. uint16 - масштабується до 8 біт)")
+    parser.add_argument('--percentile', type=float,
+                        help="Нормалізувати фільтри контурів за процентилем замість максимуму")
+    parser.add_argument('--workers', type=int, help="Кількість потоків для смуг (за замовчуванням - як у пулі потоків)")
+    parser.add_argument('--trace', help="Дописувати час етапів у JSONL-файл")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        lab1_trace.enable(args.trace)
+    start = time.perf_counter()
+    shape = stream_filter(args.source, args.output, args.filter, args.strip_height,
+                          args.raw_shape, args.raw_dtype, args.percentile, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Фільтр {args.filter}: {shape[1]}×{shape[0]} за {elapsed:.2f} с")
+    if args.trace:
+        print(lab1_trace.format_records(lab1_trace.take_records()))
+
+
+if __name__ == "__main__":
+    main()
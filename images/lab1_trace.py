@@ -0,0 +1,111 @@
+"""Вимірювання часу етапів обробки (декодування, згортка, нормалізація, відображення...).
+
+Поки профілювання вимкнене, stage() повертає спільний порожній контекст,
+тому виміри в гарячих місцях нічого не коштують. Після enable() кожен етап
+записує тривалість і пік виділеної пам'яті (tracemalloc), а якщо задано
+trace_path - ще й дописує запис у JSONL-файл для подальшого аналізу.
+
+Пік у tracemalloc один на процес, тому етапи можуть бути вкладеними (тайли
+всередині фільтра) і виконуватися в кількох потоках: перед скиданням піку
+для нового етапу поточний пік зараховується всім активним етапам. Пам'ять
+етапу - це зростання піку всього процесу за час етапу, тобто в багатопотоковому
+коді вона включає виділення паралельних потоків.
+"""
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+
+_NULL_STAGE = contextlib.nullcontext()
+
+_enabled = False
+_trace_path = None
+_records = []
+_active = set()
+_lock = threading.Lock()
+
+
+def enable(trace_path=None):
+    """Увімкнути профілювання (і запис у JSONL, якщо задано trace_path)."""
+    global _enabled, _trace_path
+    _trace_path = trace_path
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    take_records()
+
+
+def is_enabled():
+    return _enabled
+
+
+def stage(name, shape=None, kernel=None):
+    """Контекст для вимірювання одного етапу; shape - розмір даних, kernel - розмір ядра."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, shape, kernel)
+
+
+def take_records():
+    """Повертає записи, зібрані від попереднього виклику, і очищує їх."""
+    global _records
+    with _lock:
+        records, _records = _records, []
+    return records
+
+
+def format_records(records):
+    """Короткий підсумок для рядка стану: час кожного етапу в мс."""
+    totals = {}
+    for record in records:
+        totals[record['stage']] = totals.get(record['stage'], 0.0) + record['duration_ms']
+    return ' | '.join(f"{name}: {ms:.1f} мс" for name, ms in totals.items())
+
+
+class _Stage:
+    def __init__(self, name, shape, kernel):
+        self.name = name
+        self.shape = shape
+        self.kernel = kernel
+
+    def __enter__(self):
+        with _lock:
+            current, peak = tracemalloc.get_traced_memory()
+            # Скидання піку нижче стерло б його для зовнішніх і паралельних етапів,
+            # тому спершу зараховуємо його їм
+            for active in _active:
+                active.peak = max(active.peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+            self.peak = current
+            _active.add(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        with _lock:
+            _active.discard(self)
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        record = {
+            'stage': self.name,
+            'shape': list(self.shape) if self.shape is not None else None,
+            'kernel': list(self.kernel) if self.kernel is not None else None,
+            'duration_ms': duration * 1000.0,
+            'bytes_allocated': max(0, peak - self.start_memory),
+            'time': time.time(),
+        }
+        with _lock:
+            _records.append(record)
+            if _trace_path:
+                with open(_trace_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return False
@@ -0,0 +1,193 @@
+"""Пакетне градаційне перетворення зображень у кількох процесах.
+
+Ланцюжок задається рядком кроків через "|", параметри - через кому:
+    python batch.py photos/ -o out/ --spec "log:c=1,r=0.5 | power:gamma=0.8"
+    find /data -name '*.tif' | python batch.py --list - -o out/ --preset preset.json
+
+Кожен файл читається, перетворюється і записується в окремому процесі;
+список файлів обробляється потоково (у черзі лише кілька завдань на процес).
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from processing import ImageProcessor, validate_steps
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff')
+
+# Короткі назви параметрів у специфікації
+PARAM_ALIASES = {'r': 'r_param'}
+
+
+def parse_spec(spec):
+    """'log:c=1,r=0.5 | power:gamma=0.8' -> [('log', {'c': 1.0, 'r_param': 0.5}), ('power', {'gamma': 0.8})]"""
+    steps = []
+    for part in spec.split('|'):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, args = part.partition(':')
+        name = name.strip()
+        params = {}
+        for arg in filter(None, (a.strip() for a in args.split(','))):
+            key, sep, value = arg.partition('=')
+            if not sep:
+                raise ValueError(f"Очікувалось параметр=значення: {arg}")
+            key = key.strip()
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"Нечислове значення параметра у '{part}': {arg}") from None
+            if key == 'n':
+                if not value.is_integer():
+                    raise ValueError(f"n має бути цілим у '{part}': {arg}")
+                value = int(value)
+            params[PARAM_ALIASES.get(key, key)] = value
+        steps.append((name, params))
+    if not steps:
+        raise ValueError("Порожній ланцюжок перетворень")
+    return validate_steps(steps)
+
+
+def list_relative_path(path):
+    """Шлях для вихідного файлу з --list: відносний шлях зберігається
+    (a/x.png і b/x.png не перезапишуть одне одного), абсолютний - лише ім'я файлу
+    """
+    path = os.path.normpath(path)
+    if os.path.isabs(path) or path == os.pardir or path.startswith(os.pardir + os.sep):
+        return os.path.basename(path)
+    return path
+
+
+def iter_jobs(inputs, list_file, output_dir, suffix, extension):
+    """Потоково генерує пари (вхідний файл, вихідний файл).
+    Якщо вихідний файл збігається з уже виданим, замість нього - None.
+    """
+    seen = set()
+
+    def job(path, relative):
+        stem, ext = os.path.splitext(relative)
+        output_path = os.path.join(output_dir, stem + suffix + (extension or ext))
+        key = os.path.normcase(os.path.normpath(output_path))
+        if key in seen:
+            return path, None
+        seen.add(key)
+        return path, output_path
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(dirpath, filename)
+                        yield job(path, os.path.relpath(path, item))
+        else:
+            yield job(item, os.path.basename(item))
+
+    if list_file:
+        stream = sys.stdin if list_file == '-' else open(list_file, encoding='utf-8')
+        try:
+            for line in stream:
+                path = line.strip()
+                if path:
+                    yield job(path, list_relative_path(path))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def process_file(path, output_path, steps):
+    """Читання, перетворення і запис одного файлу (виконується у процесі-виконавці)"""
+    try:
+        processor = ImageProcessor()
+        processor.load_image(path)
+        processor.apply_steps(steps)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        processor.save_image(output_path)
+        return path, None
+    except Exception as e:  # одна пошкоджена картинка не зупиняє всю партію
+        return path, f"{type(e).__name__}: {e}"
+
+
+def run_batch(jobs, steps, workers=None, max_pending=None, report=print):
+    """Обробляє jobs у пулі процесів; повертає (кількість успішних, список помилок, секунди)"""
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    done_count = 0
+    errors = []
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        jobs = iter(jobs)
+        exhausted = False
+        while pending or not exhausted:
+            # Обмежена кількість завдань у черзі: список файлів не читається наперед повністю
+            while not exhausted and len(pending) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                elif job[1] is None:
+                    # Інакше два вхідні файли мовчки записалися б в один вихідний
+                    errors.append((job[0], "вихідний файл збігається з вихідним файлом іншого зображення"))
+                    report(f"Помилка: {job[0]}: {errors[-1][1]}")
+                else:
+                    pending.add(executor.submit(process_file, job[0], job[1], steps))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, error = future.result()
+                if error is None:
+                    done_count += 1
+                else:
+                    errors.append((path, error))
+                    report(f"Помилка: {path}: {error}")
+                total = done_count + len(errors)
+                if total % 100 == 0:
+                    elapsed = time.perf_counter() - start
+                    report(f"{total} файлів, {total / elapsed:.1f} зобр./с")
+
+    return done_count, errors, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетні градаційні перетворення зображень")
+    parser.add_argument('inputs', nargs='*', help="Файли або каталоги з зображеннями")
+    parser.add_argument('--list', help="Файл зі списком шляхів (по одному в рядку), '-' - stdin")
+    parser.add_argument('-o', '--output-dir', required=True, help="Каталог для результатів")
+    chain = parser.add_mutually_exclusive_group(required=True)
+    chain.add_argument('--spec', help="Ланцюжок, напр. \"log:c=1,r=0.5 | power:gamma=0.8\"")
+    chain.add_argument('--preset', help="JSON-пресет, збережений у GUI")
+    parser.add_argument('--suffix', default='', help="Суфікс до імені вихідного файлу")
+    parser.add_argument('--format', help="Розширення вихідних файлів (.png, .tif...), за замовчуванням - як у вхідних")
+    parser.add_argument('--workers', type=int, help="Кількість процесів (за замовчуванням - кількість ядер)")
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.list:
+        parser.error("Вкажіть файли, каталоги або --list")
+    try:
+        # Ланцюжок перевіряється один раз тут, до запуску пулу, а не у кожному процесі
+        steps = parse_spec(args.spec) if args.spec else ImageProcessor.load_preset(args.preset)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        parser.error(f"Неправильний ланцюжок: {e}")
+
+    extension = None
+    if args.format:
+        extension = args.format if args.format.startswith('.') else '.' + args.format
+    jobs = iter_jobs(args.inputs, args.list, args.output_dir, args.suffix, extension)
+    done_count, errors, elapsed = run_batch(jobs, steps, args.workers)
+
+    total = done_count + len(errors)
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Оброблено {done_count} з {total} файлів за {elapsed:.2f} с ({rate:.1f} зобр./с)")
+    if errors:
+        print(f"Помилок: {len(errors)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
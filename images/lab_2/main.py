@@ -1,134 +1,10 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 from PIL import Image, ImageTk
-import numpy as np
 import os
 
-class ImageProcessor:
-    def __init__(self):
-        self.current_image = None
-        self.original_image = None
-        self.image_path = None
-    
-    def load_image(self, path):
-        """Завантаження зображення"""
-        self.image_path = path
-        self.original_image = Image.open(path).convert('RGB')
-        self.current_image = self.original_image.copy()
-        return self.current_image
-    
-    def reset_image(self):
-        """Скидання до оригінального зображення"""
-        if self.original_image:
-            self.current_image = self.original_image.copy()
-            return self.current_image
-        return None
-    
-    def invert(self, img=None):
-        """Негатив (інверсія)"""
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None
-        
-        img_array = np.array(img, dtype=np.uint8)
-        inverted = 255 - img_array
-        self.current_image = Image.fromarray(inverted)
-        return self.current_image
-    
-    def logarithmic(self, img=None, c=1, r_param=1):
-        """Логарифмічне перетворення: s = c * ln(1 + r * pixel)
-        Впроваджено масштабування так, щоб результат займав діапазон [0,255].
-        Формально: s_raw = c * ln(1 + r * pixel)
-        s = (s_raw / s_raw_max) * 255, де s_raw_max = c * ln(1 + r * 255)
-        """
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None
-        
-        img_array = np.array(img, dtype=np.float32)
-        # Працюємо в діапазоні [0,255] без попередньої нормалізації в [0,1]
-        r = float(r_param) if r_param is not None else 1.0
-        # Захист від нульового r
-        if r <= 0:
-            r = 1e-6
-
-        # Обчислюємо сировинне логарифмічне значення
-        s_raw = c * np.log1p(r * img_array)
-
-        # Максимальне можливе значення s_raw для пікселя=255
-        s_raw_max = c * np.log1p(r * 255.0)
-        if s_raw_max > 0:
-            log_transformed = (s_raw / s_raw_max) * 255.0
-        else:
-            log_transformed = np.zeros_like(s_raw)
-
-        log_transformed = np.clip(log_transformed, 0, 255)
-        self.current_image = Image.fromarray(log_transformed.astype(np.uint8))
-        return self.current_image
-    
-    def inverse_logarithmic(self, img=None, c=1, r_param=1):
-        """Зворотне логарифмічне перетворення для формули s = c * ln(1 + r * pixel).
-        Пряме перетворення масштабувалось в [0,255] використовуючи s_raw_max = c*ln(1+r*255).
-        Для відновлення пікселя:
-        pixel = (exp( (s/255) * ln(1 + r*255) ) - 1) / r
-        """
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None
-        
-        img_array = np.array(img, dtype=np.float32)
-        r = float(r_param) if r_param is not None else 1.0
-        if r <= 0:
-            r = 1e-6
-
-        # Відношення від 0 до 1 від масштабованого виходу
-        s_ratio = img_array / 255.0
-
-        # Максимальний логарифмічний аргумент
-        ln_max = np.log1p(r * 255.0)
-
-        # Відновлюємо первинне ln(1 + r*pixel) значення
-        ln_vals = s_ratio * ln_max
-
-        # Використовуємо expm1 для підвищеної точності: exp(x)-1
-        pixel_rec = (np.expm1(ln_vals)) / r
-
-        pixel_rec = np.clip(pixel_rec, 0, 255)
-        self.current_image = Image.fromarray(pixel_rec.astype(np.uint8))
-        return self.current_image
-    
-    def power_law(self, img=None, gamma=1.0, c=1):
-        """n-на степінь (степеневе перетворення)"""
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None
-        
-        img_array = np.array(img, dtype=np.float32) / 255.0
-        power_transformed = c * np.power(img_array, gamma)
-        power_transformed = np.clip(power_transformed * 255, 0, 255)
-        self.current_image = Image.fromarray(power_transformed.astype(np.uint8))
-        return self.current_image
-    
-    def nth_root(self, img=None, n=2, c=1):
-        """Корінь n-ої степені"""
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None
-        
-        gamma = 1.0 / n
-        return self.power_law(img, gamma, c)
-    
-    def save_image(self, path):
-        """Збереження зображення"""
-        if self.current_image:
-            self.current_image.save(path)
-            return True
-        return False
+# Обробка зображень - у processing (без GUI); тут лише інтерфейс
+from processing import ImageProcessor, PreviewCache, chain_key, to_display
 
 
 class ImageProcessorGUI:
@@ -139,6 +15,12 @@ class ImageProcessorGUI:
         
         self.processor = ImageProcessor()
         self.display_image = None
+        # Прев'ю за (зображення, ланцюжок кроків, розмір): повернення до попередніх
+        # значень повзунків нічого не перераховує
+        self.preview_cache = PreviewCache()
+        self._preview_job = None
+        # Розмір зображення на canvas, визначається при першому показі
+        self.display_size = None
         
         self.setup_ui()
     
@@ -160,6 +42,15 @@ class ImageProcessorGUI:
                              bg='#FF9800', fg='white', font=('Arial', 10, 'bold'), padx=15, pady=5)
         btn_reset.pack(side=tk.LEFT, padx=5)
         
+        # Пресети: ланцюжок застосованих перетворень для інших зображень
+        btn_save_preset = tk.Button(control_frame, text="📋 Зберегти пресет", command=self.save_preset,
+                                    bg='#607D8B', fg='white', font=('Arial', 10, 'bold'), padx=15, pady=5)
+        btn_save_preset.pack(side=tk.LEFT, padx=5)
+        
+        btn_apply_preset = tk.Button(control_frame, text="📥 Застосувати пресет", command=self.apply_preset,
+                                     bg='#607D8B', fg='white', font=('Arial', 10, 'bold'), padx=15, pady=5)
+        btn_apply_preset.pack(side=tk.LEFT, padx=5)
+        
         # Фрейм для перетворень
         transform_frame = tk.LabelFrame(self.root, text="Градаційні перетворення", 
                                        font=('Arial', 11, 'bold'), padx=10, pady=10)
@@ -174,11 +65,13 @@ class ImageProcessorGUI:
         log_frame = tk.Frame(transform_frame)
         log_frame.pack(pady=5)
         tk.Label(log_frame, text="c:").pack(side=tk.LEFT)
-        self.log_c = tk.Scale(log_frame, from_=0.1, to=5, resolution=0.1, orient=tk.HORIZONTAL, length=150)
+        self.log_c = tk.Scale(log_frame, from_=0.1, to=5, resolution=0.1, orient=tk.HORIZONTAL, length=150,
+                              command=lambda _v: self.schedule_preview('log'))
         self.log_c.set(1)
         self.log_c.pack(side=tk.LEFT)
         tk.Label(log_frame, text=" r:").pack(side=tk.LEFT, padx=(6,0))
-        self.log_r = tk.Scale(log_frame, from_=0.001, to=5, resolution=0.001, orient=tk.HORIZONTAL, length=120)
+        self.log_r = tk.Scale(log_frame, from_=0.001, to=5, resolution=0.001, orient=tk.HORIZONTAL, length=120,
+                              command=lambda _v: self.schedule_preview('log'))
         self.log_r.set(1)
         self.log_r.pack(side=tk.LEFT)
         tk.Button(transform_frame, text="Застосувати", command=self.apply_log,
@@ -189,11 +82,13 @@ class ImageProcessorGUI:
         invlog_frame = tk.Frame(transform_frame)
         invlog_frame.pack(pady=5)
         tk.Label(invlog_frame, text="c:").pack(side=tk.LEFT)
-        self.invlog_c = tk.Scale(invlog_frame, from_=0.1, to=5, resolution=0.1, orient=tk.HORIZONTAL, length=150)
+        self.invlog_c = tk.Scale(invlog_frame, from_=0.1, to=5, resolution=0.1, orient=tk.HORIZONTAL, length=150,
+                                 command=lambda _v: self.schedule_preview('invlog'))
         self.invlog_c.set(1)
         self.invlog_c.pack(side=tk.LEFT)
         tk.Label(invlog_frame, text=" r:").pack(side=tk.LEFT, padx=(6,0))
-        self.invlog_r = tk.Scale(invlog_frame, from_=0.001, to=5, resolution=0.001, orient=tk.HORIZONTAL, length=120)
+        self.invlog_r = tk.Scale(invlog_frame, from_=0.001, to=5, resolution=0.001, orient=tk.HORIZONTAL, length=120,
+                                 command=lambda _v: self.schedule_preview('invlog'))
         self.invlog_r.set(1)
         self.invlog_r.pack(side=tk.LEFT)
         tk.Button(transform_frame, text="Застосувати", command=self.apply_invlog,
@@ -204,7 +99,8 @@ class ImageProcessorGUI:
         power_frame = tk.Frame(transform_frame)
         power_frame.pack(pady=5)
         tk.Label(power_frame, text="γ:").pack(side=tk.LEFT)
-        self.gamma = tk.Scale(power_frame, from_=0.1, to=5, resolution=0.1, orient=tk.HORIZONTAL, length=150)
+        self.gamma = tk.Scale(power_frame, from_=0.1, to=5, resolution=0.1, orient=tk.HORIZONTAL, length=150,
+                              command=lambda _v: self.schedule_preview('power'))
         self.gamma.set(1)
         self.gamma.pack(side=tk.LEFT)
         tk.Button(transform_frame, text="Застосувати", command=self.apply_power,
@@ -215,7 +111,8 @@ class ImageProcessorGUI:
         root_frame = tk.Frame(transform_frame)
         root_frame.pack(pady=5)
         tk.Label(root_frame, text="n:").pack(side=tk.LEFT)
-        self.root_n = tk.Scale(root_frame, from_=2, to=10, resolution=1, orient=tk.HORIZONTAL, length=150)
+        self.root_n = tk.Scale(root_frame, from_=2, to=10, resolution=1, orient=tk.HORIZONTAL, length=150,
+                               command=lambda _v: self.schedule_preview('root'))
         self.root_n.set(2)
         self.root_n.pack(side=tk.LEFT)
         tk.Button(transform_frame, text="Застосувати", command=self.apply_root,
@@ -236,15 +133,20 @@ class ImageProcessorGUI:
     def load_image(self):
         file_path = filedialog.askopenfilename(
             title="Виберіть зображення",
-            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.gif")]
+            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.gif *.tif *.tiff")]
         )
         if file_path:
             # Скинути збережений розмір при завантаженні нового зображення
-            if hasattr(self, 'display_size'):
-                delattr(self, 'display_size')
-            img = self.processor.load_image(file_path)
+            self.display_size = None
+            self.preview_cache.clear()
+            try:
+                img = self.processor.load_image(file_path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Помилка", f"Не вдалося відкрити зображення: {e}")
+                return
             self.display_current_image()
-            self.info_label.config(text=f"Завантажено: {os.path.basename(file_path)}")
+            depth = {8: "", 16: " (16 біт)", None: " (float)"}[self.processor.bits]
+            self.info_label.config(text=f"Завантажено: {os.path.basename(file_path)}{depth}")
     
     def save_image(self):
         if self.processor.current_image is None:
@@ -253,58 +155,151 @@ class ImageProcessorGUI:
         
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
-            filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("All files", "*.*")]
+            filetypes=[("PNG files", "*.png"), ("TIFF files", "*.tif"), ("JPEG files", "*.jpg"), ("All files", "*.*")]
         )
         if file_path:
             self.processor.save_image(file_path)
             messagebox.showinfo("Успіх", "Зображення збережено!")
     
+    def save_preset(self):
+        if not self.processor.chain:
+            messagebox.showwarning("Попередження", "Не застосовано жодного перетворення!")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.processor.save_preset(file_path)
+            self.info_label.config(text=f"Пресет збережено: {os.path.basename(file_path)} "
+                                        f"({len(self.processor.chain)} кроків)")
+    
+    def apply_preset(self):
+        if self.processor.current_image is None:
+            messagebox.showwarning("Попередження", "Спочатку завантажте зображення!")
+            return
+        
+        file_path = filedialog.askopenfilename(
+            title="Виберіть пресет",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            try:
+                steps = self.processor.load_preset(file_path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                messagebox.showerror("Помилка", f"Не вдалося завантажити пресет: {e}")
+                return
+            self.processor.apply_steps(steps)
+            self.display_current_image()
+            self.info_label.config(text=f"Застосовано пресет: {os.path.basename(file_path)} ({len(steps)} кроків)")
+    
     def reset_image(self):
         img = self.processor.reset_image()
-        if img:
+        if img is not None:
             self.display_current_image()
             self.info_label.config(text="Зображення скинуто до оригіналу")
     
+    def slider_step(self, name):
+        """Крок перетворення з поточними значеннями повзунків"""
+        if name == 'log':
+            return ('log', {'c': self.log_c.get(), 'r_param': self.log_r.get()})
+        if name == 'invlog':
+            return ('invlog', {'c': self.invlog_c.get(), 'r_param': self.invlog_r.get()})
+        if name == 'power':
+            return ('power', {'gamma': self.gamma.get(), 'c': 1})
+        if name == 'root':
+            return ('root', {'n': self.root_n.get(), 'c': 1})
+        return ('invert', {})
+    
+    @staticmethod
+    def describe_step(step):
+        name, params = step
+        if name == 'log':
+            return f"Логарифм (c={params['c']:.2f}, r={params['r_param']:.3f})"
+        if name == 'invlog':
+            return f"Зворотний логарифм (c={params['c']:.2f}, r={params['r_param']:.3f})"
+        if name == 'power':
+            return f"n-на степінь (γ={params['gamma']:.1f})"
+        if name == 'root':
+            return f"Корінь {params['n']}-ої степені"
+        return "Негатив"
+    
+    def schedule_preview(self, name):
+        """Живий перегляд під час руху повзунка (події зливаються в одне оновлення)"""
+        if self.processor.base_image is None:
+            return
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(15, self.show_preview, name)
+    
+    def show_preview(self, name):
+        self._preview_job = None
+        step = self.slider_step(name)
+        self._ensure_display_size()
+        self._show_on_canvas(self._preview([step]))
+        self.info_label.config(text=f"Попередній перегляд: {self.describe_step(step)}")
+    
+    def _proxy_image(self):
+        """Базове зображення, зменшене до розміру canvas (один раз на зображення)"""
+        key = ('proxy', id(self.processor.base_image), self.display_size)
+        img = self.preview_cache.get(key)
+        if img is None:
+            img = self.preview_cache.put(key, self.processor.proxy(self.display_size))
+        return img
+    
+    def _preview(self, steps):
+        """Ланцюжок з додатковими кроками, застосований до зменшеної копії"""
+        key = (id(self.processor.base_image), chain_key(self.processor.chain + steps), self.display_size)
+        img = self.preview_cache.get(key)
+        if img is None:
+            img = to_display(self.processor.render(self._proxy_image(), steps))
+            if img.size != self.display_size:
+                img = img.resize(self.display_size, Image.Resampling.LANCZOS)
+            self.preview_cache.put(key, img)
+        return img
+    
+    def _apply_step(self, step):
+        """Прев'ю показується одразу, повне зображення обробляється у фоні"""
+        if self.processor.base_image is None:
+            return
+        self._ensure_display_size()
+        preview = self._preview([step])
+        future = self.processor.apply_steps([step], background=True)
+        self._show_on_canvas(preview)
+        self.info_label.config(text=f"Застосовується: {self.describe_step(step)}...")
+        self._wait_for_apply(future, step)
+    
+    def _wait_for_apply(self, future, step):
+        if not future.done():
+            self.root.after(30, self._wait_for_apply, future, step)
+            return
+        # Новіше застосування вже замінило це - показувати нічого
+        if not self.processor.is_pending(future):
+            return
+        if future.exception() is not None:
+            messagebox.showerror("Помилка", f"Не вдалося застосувати перетворення: {future.exception()}")
+            self.reset_image()
+            return
+        self.display_current_image()
+        self.info_label.config(text=f"Застосовано: {self.describe_step(step)}")
+    
     def apply_invert(self):
-        if self.processor.current_image:
-            self.processor.invert()
-            self.display_current_image()
-            self.info_label.config(text="Застосовано: Негатив")
+        self._apply_step(self.slider_step('invert'))
     
     def apply_log(self):
-        if self.processor.current_image:
-            c = self.log_c.get()
-            r = self.log_r.get()
-            self.processor.logarithmic(c=c, r_param=r)
-            self.display_current_image()
-            self.info_label.config(text=f"Застосовано: Логарифм (c={c:.2f}, r={r:.3f})")
+        self._apply_step(self.slider_step('log'))
     
     def apply_invlog(self):
-        if self.processor.current_image:
-            c = self.invlog_c.get()
-            r = self.invlog_r.get()
-            self.processor.inverse_logarithmic(c=c, r_param=r)
-            self.display_current_image()
-            self.info_label.config(text=f"Застосовано: Зворотний логарифм (c={c:.2f}, r={r:.3f})")
+        self._apply_step(self.slider_step('invlog'))
     
     def apply_power(self):
-        if self.processor.current_image:
-            gamma = self.gamma.get()
-            self.processor.power_law(gamma=gamma)
-            self.display_current_image()
-            self.info_label.config(text=f"Застосовано: n-на степінь (γ={gamma:.1f})")
+        self._apply_step(self.slider_step('power'))
     
     def apply_root(self):
-        if self.processor.current_image:
-            n = self.root_n.get()
-            self.processor.nth_root(n=n)
-            self.display_current_image()
-            self.info_label.config(text=f"Застосовано: Корінь {n}-ої степені")
+        self._apply_step(self.slider_step('root'))
     
-    def display_current_image(self):
-        if self.processor.current_image is None:
-            return
-        
+    def _canvas_size(self):
         # Оновити canvas для отримання актуальних розмірів
         self.canvas.update_idletasks()
         
@@ -315,16 +310,18 @@ class ImageProcessorGUI:
         if canvas_width <= 1 or canvas_height <= 1:
             canvas_width = 600
             canvas_height = 500
-        
-        # При першому завантаженні зберегти розміри для масштабування
-        if not hasattr(self, 'display_size'):
-            img = self.processor.current_image.copy()
-            img.thumbnail((canvas_width - 40, canvas_height - 40), Image.Resampling.LANCZOS)
-            self.display_size = img.size
-        
-        # Масштабування зображення до збереженого розміру
-        img = self.processor.current_image.copy()
-        img = img.resize(self.display_size, Image.Resampling.LANCZOS)
+        return canvas_width, canvas_height
+    
+    def _ensure_display_size(self):
+        # При першому показі зберегти розміри для масштабування (як thumbnail, без збільшення)
+        if self.display_size is None:
+            canvas_width, canvas_height = self._canvas_size()
+            width, height = self.processor.image_size
+            scale = min(1.0, (canvas_width - 40) / width, (canvas_height - 40) / height)
+            self.display_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    
+    def _show_on_canvas(self, img):
+        canvas_width, canvas_height = self._canvas_size()
         
         # Конвертація для Tkinter
         self.display_image = ImageTk.PhotoImage(img)
@@ -334,6 +331,16 @@ class ImageProcessorGUI:
         x = canvas_width // 2
         y = canvas_height // 2
         self.canvas.create_image(x, y, anchor=tk.CENTER, image=self.display_image)
+    
+    def display_current_image(self):
+        if self.processor.base_image is None:
+            return
+        
+        self._ensure_display_size()
+        
+        # Ланцюжок таблиць застосовується до вже зменшеної копії: повне
+        # зображення для показу не копіюється і не масштабується
+        self._show_on_canvas(self._preview([]))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,431 @@
+"""Градаційні перетворення зображень без GUI.
+
+Криві, таблиці (LUT), читання зображень зі збереженням глибини і
+ImageProcessor з ланцюжком кроків. Модуль не імпортує tkinter, тож його
+використовують і GUI (main.py), і пакетна обробка в пулі процесів (batch.py).
+"""
+from PIL import Image
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
+import os
+
+
+# Кожне градаційне перетворення задане кривою над значеннями пікселя в шкалі
+# [0,255]. Для uint8 (256 значень) і uint16 (65 536 значень) крива
+# обчислюється один раз як таблиця (LUT), а до зображення застосовується
+# через Image.point або індексацію NumPy без проміжних float-масивів.
+# Зображення з плаваючою комою (нормалізовані в [0,1]) обробляються кривими напряму.
+LEVELS = np.arange(256, dtype=np.float32)
+
+
+def invert_curve(x):
+    """Негатив"""
+    return 255 - x
+
+
+def _const(value, x):
+    """Скалярна константа кривої. Для зображень (масиви 2-D/3-D) - у типі масиву,
+    щоб float32 не підвищувався до float64 і проміжні масиви не подвоювали пам'ять;
+    для одновимірних таблиць рівнів - float64, як у попіксельній версії (таблиці
+    8 біт лишаються тотожними).
+    """
+    if x.ndim > 1:
+        return x.dtype.type(value)
+    return np.float64(value)
+
+
+def log_curve(x, c=1, r_param=1):
+    """Логарифмічне перетворення s = c * ln(1 + r * pixel), масштабоване в [0,255]"""
+    r = float(r_param) if r_param is not None else 1.0
+    # Захист від нульового r
+    if r <= 0:
+        r = 1e-6
+
+    s_raw = c * np.log1p(r * x)
+    s_raw_max = _const(c * np.log1p(r * 255.0), x)
+    if s_raw_max > 0:
+        log_transformed = (s_raw / s_raw_max) * 255.0
+    else:
+        log_transformed = np.zeros_like(s_raw)
+    return np.clip(log_transformed, 0, 255)
+
+
+def inverse_log_curve(x, c=1, r_param=1):
+    """Зворотне логарифмічне перетворення:
+    pixel = (exp( (s/255) * ln(1 + r*255) ) - 1) / r
+    """
+    r = float(r_param) if r_param is not None else 1.0
+    if r <= 0:
+        r = 1e-6
+
+    ln_vals = (x / 255.0) * _const(np.log1p(r * 255.0), x)
+    pixel_rec = np.expm1(ln_vals) / r
+    return np.clip(pixel_rec, 0, 255)
+
+
+def power_curve(x, gamma=1.0, c=1):
+    """Степеневе перетворення s = c * (pixel/255)^gamma * 255"""
+    power_transformed = c * np.power(x / 255.0, gamma)
+    return np.clip(power_transformed * 255, 0, 255)
+
+
+def root_curve(x, n=2, c=1):
+    """Корінь n-ої степені (степеневе перетворення з gamma = 1/n)"""
+    return power_curve(x, 1.0 / n, c)
+
+
+# Кроки ланцюжка перетворень: назва -> крива з параметрами
+TRANSFORMS = {
+    'invert': invert_curve,
+    'log': log_curve,
+    'invlog': inverse_log_curve,
+    'power': power_curve,
+    'root': root_curve,
+}
+
+
+def build_lut(name, params, bits=8):
+    """Таблиця кроку для цілочисельних зображень з глибиною bits (8 або 16)"""
+    if bits == 8:
+        # Як і в попіксельній версії: дробова частина відкидається
+        return TRANSFORMS[name](LEVELS, **params).astype(np.uint8)
+    levels = np.arange(65536, dtype=np.float32) * np.float32(255.0 / 65535.0)
+    return np.rint(TRANSFORMS[name](levels, **params) * (65535.0 / 255.0)).astype(np.uint16)
+
+
+def step_key(name, params):
+    """Ключ кроку (перетворення, c, r/gamma/n) для кешів"""
+    return (name, tuple(sorted(params.items())))
+
+
+def chain_key(steps):
+    return tuple(step_key(name, params) for name, params in steps)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_lut(name, params, bits):
+    lut = build_lut(name, dict(params), bits)
+    # Таблиця спільна для всіх викликів, тому лише для читання
+    lut.setflags(write=False)
+    return lut
+
+
+def transform_lut(name, params, bits=8):
+    """Таблиця кроку; повторні значення повзунків беруться з кешу"""
+    return _cached_lut(*step_key(name, params), bits)
+
+
+def validate_steps(steps):
+    """Перевірка ланцюжка [(назва, параметри), ...]: відома назва і параметри,
+    з якими будується таблиця (заодно таблиці потрапляють у кеш). ValueError інакше.
+    """
+    for name, params in steps:
+        if name not in TRANSFORMS:
+            raise ValueError(f"Невідоме перетворення: {name} (доступні: {', '.join(TRANSFORMS)})")
+        try:
+            if name == 'root' and not params.get('n', 2) >= 1:
+                raise ValueError("n має бути цілим >= 1")
+            if name == 'power' and not params.get('gamma', 1.0) > 0:
+                raise ValueError("gamma має бути > 0")
+            transform_lut(name, params)
+        except (TypeError, ValueError, AttributeError, ArithmeticError) as e:
+            raise ValueError(f"Неправильні параметри для {name}: {e}") from None
+    return steps
+
+
+def compose_luts(steps, lut=None, bits=8):
+    """Композиція таблиць кроків [(назва, параметри), ...] в одну.
+    Кожна таблиця повертає цілі значення, тому lut2[lut1] дає те саме
+    округлення, що й покрокове застосування перетворень до зображення.
+    """
+    for name, params in steps:
+        step_lut = transform_lut(name, params, bits)
+        lut = step_lut if lut is None else step_lut[lut]
+    return lut
+
+
+def apply_lut(img, lut):
+    """Застосування таблиці до кожного каналу зображення (один прохід у C)"""
+    if isinstance(img, np.ndarray):
+        return lut[img]
+    return img.point(lut.tolist() * len(img.getbands()))
+
+
+def apply_curves(img, steps):
+    """Кроки для зображення з плаваючою комою в [0,1] (без квантування між кроками)"""
+    x = img * np.float32(255)
+    for name, params in steps:
+        x = TRANSFORMS[name](x, **params).astype(np.float32, copy=False)
+    x *= np.float32(1 / 255)
+    return x
+
+
+def to_display(img):
+    """8-бітна копія для відображення (квантування лише тут)"""
+    if not isinstance(img, np.ndarray):
+        return img
+    if img.dtype == np.uint16:
+        return Image.fromarray((img >> 8).astype(np.uint8))
+    return Image.fromarray((np.clip(img, 0, 1) * 255).astype(np.uint8))
+
+
+def _import_tifffile():
+    try:
+        import tifffile
+    except ImportError:
+        return None
+    return tifffile
+
+
+def read_image(path):
+    """Читання зображення зі збереженням глибини:
+    8 біт -> PIL RGB, 16 біт -> масив uint16, float -> масив float32 у [0,1]
+    """
+    data = None
+    if os.path.splitext(path)[1].lower() in ('.tif', '.tiff'):
+        # Pillow зводить 16-бітні RGB TIFF до 8 біт, tifffile - ні
+        tifffile = _import_tifffile()
+        if tifffile is not None:
+            data = tifffile.imread(path)
+            if data.dtype == np.uint8:
+                data = None
+    if data is None:
+        img = Image.open(path)
+        if img.mode == 'RGB':
+            # Лінивий PIL-образ: пікселі декодуються при першому перетворенні
+            return img
+        if img.mode not in ('I;16', 'I;16L', 'I;16B', 'I', 'F'):
+            return img.convert('RGB')
+        data = np.array(img)
+
+    if data.ndim == 3 and data.shape[2] == 4:
+        data = data[:, :, :3]
+    if data.ndim not in (2, 3) or (data.ndim == 3 and data.shape[2] != 3):
+        raise ValueError(f"Непідтримуваний розмір даних: {data.shape}")
+    if data.dtype.kind == 'f':
+        data = data.astype(np.float32)
+        np.maximum(data, 0, out=data)
+        data_max = float(data.max()) if data.size else 0.0
+        if data_max > 1:
+            data /= np.float32(data_max)
+        return data
+    if data.dtype != np.uint16:
+        data = np.clip(data, 0, 65535).astype(np.uint16)
+    return data
+
+
+class PreviewCache:
+    """LRU-кеш зменшених до розміру canvas зображень з обмеженням за обсягом пам'яті"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+    
+    @staticmethod
+    def _image_bytes(img):
+        if isinstance(img, np.ndarray):
+            return img.nbytes
+        return img.width * img.height * len(img.getbands())
+    
+    def get(self, key):
+        img = self.entries.get(key)
+        if img is not None:
+            self.entries.move_to_end(key)
+        return img
+    
+    def put(self, key, img):
+        if key in self.entries:
+            self.total_bytes -= self._image_bytes(self.entries.pop(key))
+        self.entries[key] = img
+        self.total_bytes += self._image_bytes(img)
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.total_bytes -= self._image_bytes(old)
+        return img
+    
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+
+class ImageProcessor:
+    def __init__(self):
+        self._current_image = None
+        self._pending = None
+        self._executor = None
+        self.original_image = None
+        self.image_path = None
+        # current_image = base_image, пропущене через chain_lut (композицію кроків chain)
+        self.base_image = None
+        self.chain = []
+        self.chain_lut = None
+        # 8 або 16 для цілочисельних зображень, None - для зображень з плаваючою комою
+        self.bits = 8
+    
+    @property
+    def current_image(self):
+        # Якщо повнорозмірний результат ще рахується у фоні - дочекатися його
+        if self._pending is not None:
+            self._current_image = self._pending.result()
+            self._pending = None
+        return self._current_image
+    
+    @current_image.setter
+    def current_image(self, img):
+        self._pending = None
+        self._current_image = img
+    
+    def load_image(self, path):
+        """Завантаження зображення"""
+        self.image_path = path
+        self.original_image = read_image(path)
+        self._set_base(self.original_image)
+        # Перетворення не змінюють зображення на місці, тому копія не потрібна
+        self.current_image = self.original_image
+        return self.current_image
+    
+    def reset_image(self):
+        """Скидання до оригінального зображення"""
+        if self.original_image is not None:
+            self._set_base(self.original_image)
+            self.current_image = self.original_image
+            return self.current_image
+        return None
+    
+    def _set_base(self, img):
+        self.base_image = img
+        self.chain = []
+        self.chain_lut = None
+        if not isinstance(img, np.ndarray):
+            self.bits = 8
+        else:
+            self.bits = 16 if img.dtype == np.uint16 else None
+    
+    def render(self, img, steps=()):
+        """Застосовує ланцюжок (і додаткові кроки) до img тієї ж глибини, що й base_image"""
+        if self.bits is None:
+            return apply_curves(img, self.chain + list(steps))
+        lut = compose_luts(steps, self.chain_lut, self.bits)
+        return img if lut is None else apply_lut(img, lut)
+    
+    @property
+    def image_size(self):
+        """(ширина, висота) base_image"""
+        if isinstance(self.base_image, np.ndarray):
+            return self.base_image.shape[1], self.base_image.shape[0]
+        return self.base_image.size
+    
+    def proxy(self, size):
+        """Зменшена копія base_image розміру size (для масивів - приблизно size) у власній глибині"""
+        base = self.base_image
+        if isinstance(base, np.ndarray):
+            step_y = max(1, base.shape[0] // size[1])
+            step_x = max(1, base.shape[1] // size[0])
+            return np.ascontiguousarray(base[::step_y, ::step_x])
+        
+        if base is self.original_image and base.format == 'JPEG':
+            # JPEG декодується одразу зі зменшенням у 2-8 разів (DCT), повне декодування не потрібне
+            with Image.open(self.image_path) as img:
+                img.draft('RGB', size)
+                return img.convert('RGB').resize(size, Image.Resampling.LANCZOS)
+        # Швидке зменшення цілим множником (усереднення блоків), далі точне LANCZOS
+        factor = min(base.width // size[0], base.height // size[1])
+        if factor >= 2:
+            base = base.reduce(factor)
+        return base.resize(size, Image.Resampling.LANCZOS)
+    
+    def apply_steps(self, steps, img=None, background=False):
+        """Додає кроки до ланцюжка і застосовує всю композицію одним проходом.
+        Якщо передано img, ланцюжок починається заново від цього зображення.
+        З background=True прохід по повному зображенню виконується у фоновому
+        потоці і повертається Future (current_image дочекається результату).
+        """
+        if img is not None:
+            self._set_base(img)
+        if self.base_image is None:
+            return None
+        
+        steps = [(name, dict(params)) for name, params in steps]
+        if self.bits is not None:
+            self.chain_lut = compose_luts(steps, self.chain_lut, self.bits)
+        self.chain.extend(steps)
+        if not background:
+            self.current_image = self.render(self.base_image)
+            return self.current_image
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = self._executor.submit(self.render, self.base_image)
+        return self._pending
+    
+    def is_pending(self, future):
+        """Чи future - останнє фонове застосування (а не вже замінене новішим)"""
+        return future is self._pending
+    
+    def get_preset(self):
+        """Поточний ланцюжок кроків для повторного використання на інших зображеннях"""
+        return [(name, dict(params)) for name, params in self.chain]
+    
+    def save_preset(self, path):
+        """Збереження ланцюжка у JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{'transform': name, 'params': params} for name, params in self.chain],
+                      f, ensure_ascii=False, indent=2)
+    
+    @staticmethod
+    def load_preset(path):
+        """Завантаження ланцюжка з JSON (для apply_steps)"""
+        with open(path, encoding='utf-8') as f:
+            steps = [(step['transform'], step['params']) for step in json.load(f)]
+        return validate_steps(steps)
+    
+    def invert(self, img=None):
+        """Негатив (інверсія)"""
+        return self.apply_steps([('invert', {})], img)
+    
+    def logarithmic(self, img=None, c=1, r_param=1):
+        """Логарифмічне перетворення: s = c * ln(1 + r * pixel)
+        Впроваджено масштабування так, щоб результат займав діапазон [0,255].
+        Формально: s_raw = c * ln(1 + r * pixel)
+        s = (s_raw / s_raw_max) * 255, де s_raw_max = c * ln(1 + r * 255)
+        """
+        return self.apply_steps([('log', {'c': c, 'r_param': r_param})], img)
+    
+    def inverse_logarithmic(self, img=None, c=1, r_param=1):
+        """Зворотне логарифмічне перетворення для формули s = c * ln(1 + r * pixel).
+        Пряме перетворення масштабувалось в [0,255] використовуючи s_raw_max = c*ln(1+r*255).
+        Для відновлення пікселя:
+        pixel = (exp( (s/255) * ln(1 + r*255) ) - 1) / r
+        """
+        return self.apply_steps([('invlog', {'c': c, 'r_param': r_param})], img)
+    
+    def power_law(self, img=None, gamma=1.0, c=1):
+        """n-на степінь (степеневе перетворення)"""
+        return self.apply_steps([('power', {'gamma': gamma, 'c': c})], img)
+    
+    def nth_root(self, img=None, n=2, c=1):
+        """Корінь n-ої степені"""
+        return self.apply_steps([('root', {'n': n, 'c': c})], img)
+    
+    def save_image(self, path):
+        """Збереження зображення (16 біт і float - без втрати глибини, де формат дозволяє)"""
+        img = self.current_image
+        if img is None:
+            return False
+        if isinstance(img, np.ndarray):
+            ext = os.path.splitext(path)[1].lower()
+            tifffile = _import_tifffile() if ext in ('.tif', '.tiff') else None
+            if tifffile is not None:
+                tifffile.imwrite(path, img)
+                return True
+            if img.dtype == np.uint16 and img.ndim == 2 and ext in ('.png', '.tif', '.tiff'):
+                Image.fromarray(img).save(path)
+                return True
+            # Інші формати підтримують лише 8 біт
+            img = to_display(img)
+        img.save(path)
+        return True
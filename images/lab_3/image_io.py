@@ -0,0 +1,89 @@
+"""Відкриття великих джерел і створення вихідних файлів для потокової обробки.
+
+Ті самі формати, що й у потоковій фільтрації lab1 (images/lab1_filters.py):
+.npy, TIFF (зокрема стиснені/тайлові через zarr) і сирі дані; джерела понад
+8 біт читаються як uint8. Пікселі в пам'ять не завантажуються - повертаються
+масиви, відображені у пам'ять, або сховища, що читаються порціями.
+
+Необов'язкові залежності: tifffile (TIFF) та zarr (стиснені або тайлові TIFF);
+вони імпортуються лише для відповідних файлів.
+"""
+import importlib
+import os
+
+import numpy as np
+
+
+def require(module_name, purpose):
+    """Імпорт необов'язкової залежності; без неї - ImportError з назвою пакета."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise ImportError(f"{purpose} потрібен пакет {module_name} (pip install {module_name})") from None
+
+
+class To8Bit:
+    """Джерело з беззнаковими цілими понад 8 біт (uint16...), що читається як uint8.
+
+    Значення масштабуються з повного діапазону типу (старші 8 біт) під час
+    читання кожної смуги, тож усе джерело в пам'ять не завантажується.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.ndim = data.ndim
+        self.dtype = np.dtype(np.uint8)
+        self.shift = data.dtype.itemsize * 8 - 8
+
+    def __getitem__(self, index):
+        return (np.asarray(self.data[index]) >> self.shift).astype(np.uint8)
+
+
+def check_source(data):
+    """Перевірка форми і типу джерела: uint8 без змін, інші беззнакові цілі - через To8Bit."""
+    if data.ndim not in (2, 3):
+        raise ValueError(f"Очікувалось зображення (висота, ширина[, канали]), отримано форму {data.shape}")
+    if data.dtype == np.uint8:
+        return data
+    if np.issubdtype(data.dtype, np.unsignedinteger):
+        return To8Bit(data)
+    raise ValueError(f"Підтримуються лише беззнакові цілі зображення (uint8, uint16...), отримано {data.dtype}")
+
+
+def open_source(path, raw_shape=None, raw_dtype='uint8'):
+    """Відкриває джерело без читання пікселів у пам'ять.
+
+    .npy - через np.load(mmap_mode='r'), TIFF - через tifffile.memmap
+    (або zarr-сховище tifffile для стиснених/тайлових TIFF), інші файли
+    вважаються сирими даними розміру raw_shape. Джерела понад 8 біт
+    читаються як uint8 (див. To8Bit), інші типи відхиляються.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        data = np.load(path, mmap_mode='r')
+    elif ext in ('.tif', '.tiff'):
+        tifffile = require('tifffile', "Для читання TIFF")
+        try:
+            data = tifffile.memmap(path, mode='r')
+        except ValueError:
+            # Стиснений або тайловий TIFF: декодуються лише потрібні смуги/тайли
+            zarr = require('zarr', "Для стиснених або тайлових TIFF")
+            data = zarr.open(tifffile.imread(path, aszarr=True), mode='r')
+    elif raw_shape is None:
+        raise ValueError("Для сирих даних потрібно вказати розмір (--raw-shape)")
+    else:
+        data = np.memmap(path, dtype=raw_dtype, mode='r', shape=tuple(raw_shape))
+    return check_source(data)
+
+
+def create_output(path, shape):
+    """Створює вихідний файл uint8 заданого розміру, відображений у пам'ять."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+    if ext in ('.tif', '.tiff'):
+        tifffile = require('tifffile', "Для запису TIFF")
+        photometric = 'minisblack' if len(shape) == 2 else 'rgb'
+        return tifffile.memmap(path, shape=shape, dtype=np.uint8, photometric=photometric)
+    return np.memmap(path, dtype=np.uint8, mode='w+', shape=shape)
@@ -5,107 +5,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
+from concurrent.futures import ThreadPoolExecutor
 import os
 
-class HistogramProcessor:
-    def __init__(self):
-        self.current_image = None
-        self.original_image = None
-        self.image_path = None
-    
-    def load_image(self, path):
-        """Завантаження зображення"""
-        self.image_path = path
-        self.original_image = Image.open(path).convert('RGB')
-        self.current_image = self.original_image.copy()
-        return self.current_image
-    
-    def reset_image(self):
-        """Скидання до оригінального зображення"""
-        if self.original_image:
-            self.current_image = self.original_image.copy()
-            return self.current_image
-        return None
-    
-    def get_histogram(self, img=None):
-        """Отримання гістограми зображення"""
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None, None, None
-        
-        img_array = np.array(img)
-        
-        # Гістограми для кожного каналу
-        hist_r = np.histogram(img_array[:,:,0], bins=256, range=(0, 256))[0]
-        hist_g = np.histogram(img_array[:,:,1], bins=256, range=(0, 256))[0]
-        hist_b = np.histogram(img_array[:,:,2], bins=256, range=(0, 256))[0]
-        
-        return hist_r, hist_g, hist_b
-    
-    def histogram_equalization(self, img=None):
-        """Еквалізація гістограми"""
-        if img is None:
-            img = self.current_image
-        if img is None:
-            return None
-        
-        img_array = np.array(img)
-        equalized = np.zeros_like(img_array)
-        
-        # Еквалізація для кожного каналу окремо
-        for i in range(3):
-            channel = img_array[:,:,i]
-            hist, bins = np.histogram(channel.flatten(), 256, [0, 256])
-            
-            # Обчислення кумулятивної функції розподілу
-            cdf = hist.cumsum()
-            cdf_normalized = cdf * 255 / cdf[-1]
-            
-            # Інтерполяція значень
-            equalized[:,:,i] = np.interp(channel.flatten(), bins[:-1], cdf_normalized).reshape(channel.shape)
-        
-        self.current_image = Image.fromarray(equalized.astype(np.uint8))
-        return self.current_image, cdf_normalized
-    
-    def power_law_transform(self, gamma=1.0):
-        """Степеневе перетворення"""
-        if self.current_image is None:
-            return None
-        
-        img_array = np.array(self.current_image, dtype=np.float32) / 255.0
-        transformed = np.power(img_array, gamma) * 255
-        self.current_image = Image.fromarray(transformed.astype(np.uint8))
-        
-        # Функція перетворення для графіка
-        x = np.linspace(0, 255, 256)
-        y = np.power(x / 255.0, gamma) * 255
-        
-        return self.current_image, x, y
-    
-    def logarithmic_transform(self, c=1.0):
-        """Логарифмічне перетворення"""
-        if self.current_image is None:
-            return None
-        
-        img_array = np.array(self.current_image, dtype=np.float32)
-        img_normalized = img_array / 255.0
-        
-        transformed = c * np.log(1 + img_normalized * (np.e - 1)) * 255
-        self.current_image = Image.fromarray(transformed.astype(np.uint8))
-        
-        # Функція перетворення для графіка
-        x = np.linspace(0, 255, 256)
-        y = c * np.log(1 + (x / 255.0) * (np.e - 1)) * 255
-        
-        return self.current_image, x, y
-    
-    def save_image(self, path):
-        """Збереження зображення"""
-        if self.current_image:
-            self.current_image.save(path)
-            return True
-        return False
+# Обробка і звіти - у processing (без GUI); тут лише інтерфейс
+from processing import HistogramPlots, HistogramProcessor, ReferenceCDFCache, render_report, report_data
 
 
 class HistogramGUI:
@@ -115,9 +19,22 @@ class HistogramGUI:
         self.root.geometry("1400x900")
         
         self.processor = HistogramProcessor()
+        self.reference_cache = ReferenceCDFCache(os.environ.get('LAB3_REFERENCE_CACHE'))
         self.original_display = None
         self.processed_display = None
         
+        # Графіки: осі та лінії створюються раз на макет і далі лише оновлюються
+        self.plots = None
+        self._plot_state = (False, None, None)
+        self._plot_background = None
+        self._plot_request = None
+        self._plot_job = None
+        
+        # Звіти рендеряться у фоновому потоці; стан перевіряється через root.after
+        self._report_executor = ThreadPoolExecutor(max_workers=1)
+        self._report_future = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         self.setup_ui()
     
     def setup_ui(self):
@@ -155,6 +72,38 @@ class HistogramGUI:
                 font=('Arial', 10, 'bold')).pack(pady=(5,5))
         tk.Button(left_panel, text="Застосувати еквалізацію", command=self.apply_equalization,
                  bg='#3F51B5', fg='white', font=('Arial', 9), width=25, pady=5).pack(pady=5)
+        self.equalize_luminance = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Лише яскравість (YCbCr)", variable=self.equalize_luminance,
+                       font=('Arial', 9)).pack()
+        
+        tk.Label(left_panel, text="─" * 30).pack(pady=10)
+        
+        # Адаптивна еквалізація
+        tk.Label(left_panel, text="Адаптивна еквалізація (CLAHE)", 
+                font=('Arial', 10, 'bold')).pack(pady=(5,5))
+        
+        clahe_frame = tk.Frame(left_panel)
+        clahe_frame.pack(pady=5)
+        tk.Label(clahe_frame, text="Ліміт:").grid(row=0, column=0)
+        self.clahe_clip_scale = tk.Scale(clahe_frame, from_=0.5, to=8.0, resolution=0.5, 
+                                         orient=tk.HORIZONTAL, length=130)
+        self.clahe_clip_scale.set(2.0)
+        self.clahe_clip_scale.grid(row=0, column=1)
+        tk.Label(clahe_frame, text="Тайли:").grid(row=1, column=0)
+        self.clahe_tiles_scale = tk.Scale(clahe_frame, from_=2, to=16, resolution=1, 
+                                          orient=tk.HORIZONTAL, length=130)
+        self.clahe_tiles_scale.set(8)
+        self.clahe_tiles_scale.grid(row=1, column=1)
+        
+        tk.Button(left_panel, text="Застосувати CLAHE", command=self.apply_clahe,
+                 bg='#673AB7', fg='white', font=('Arial', 9), width=25, pady=5).pack(pady=5)
+        
+        # Відповідність гістограмі еталона (CDF еталона кешується на диску)
+        tk.Button(left_panel, text="Відповідність еталону...", command=self.apply_matching,
+                 bg='#00796B', fg='white', font=('Arial', 9), width=25, pady=5).pack(pady=5)
+        self.match_luminance = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Відповідність лише яскравості (YCbCr)", variable=self.match_luminance,
+                       font=('Arial', 9)).pack()
         
         tk.Label(left_panel, text="─" * 30).pack(pady=10)
         
@@ -222,6 +171,8 @@ class HistogramGUI:
         self.figure = Figure(figsize=(14, 5))
         self.canvas_plot = FigureCanvasTkAgg(self.figure, plots_frame)
         self.canvas_plot.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.canvas_plot.mpl_connect('draw_event', self._on_plot_draw)
+        self.plots = HistogramPlots(self.figure, animated=True)
         
         # Інформаційна мітка
         self.info_label = tk.Label(self.root, text="Завантажте зображення для початку роботи", 
@@ -256,14 +207,47 @@ class HistogramGUI:
         if self.processor.original_image is None:
             messagebox.showwarning("Попередження", "Немає даних для збереження!")
             return
+        if self._report_future is not None and not self._report_future.done():
+            messagebox.showwarning("Попередження", "Попередній звіт ще зберігається!")
+            return
         
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
             filetypes=[("PNG files", "*.png")]
         )
-        if file_path:
-            self.figure.savefig(file_path, dpi=150, bbox_inches='tight')
-            messagebox.showinfo("Успіх", "Звіт збережено!")
+        if not file_path:
+            return
+        
+        # Дані беруться з кешованої статистики, а не з фігури на екрані
+        show_transform, transform_type, transform_data = self._plot_state
+        data = report_data(self.processor, transform_type if show_transform else None, transform_data)
+        self._report_future = self._report_executor.submit(render_report, file_path, data)
+        self.info_label.config(text=f"Зберігається звіт: {os.path.basename(file_path)}...")
+        self.root.after(self.REPORT_POLL_MS, self._poll_report)
+    
+    # Період перевірки фонового збереження звіту
+    REPORT_POLL_MS = 100
+    
+    def _poll_report(self):
+        if not self._report_future.done():
+            self.root.after(self.REPORT_POLL_MS, self._poll_report)
+            return
+        future, self._report_future = self._report_future, None
+        try:
+            path = future.result()
+        except Exception as e:
+            messagebox.showerror("Помилка", f"Не вдалося зберегти звіт: {e}")
+            return
+        self.info_label.config(text=f"Звіт збережено: {os.path.basename(path)}")
+        messagebox.showinfo("Успіх", "Звіт збережено!")
+    
+    def on_close(self):
+        """Закриття вікна: дочекатися звіту, що вже зберігається, і зупинити його потік"""
+        if self._report_future is not None and not self._report_future.done():
+            self.info_label.config(text="Завершується збереження звіту...")
+            self.root.update_idletasks()
+        self._report_executor.shutdown(wait=True, cancel_futures=True)
+        self.root.destroy()
     
     def reset_image(self):
         self.processor.reset_image()
@@ -276,10 +260,56 @@ class HistogramGUI:
             return
         
         self.processor.reset_image()
-        result = self.processor.histogram_equalization()
+        luminance_only = self.equalize_luminance.get()
+        result = self.processor.histogram_equalization(luminance_only=luminance_only)
         if result:
             self.update_display(show_transform=True, transform_type="equalization")
-            self.info_label.config(text="Застосовано: Еквалізація гістограми")
+            suffix = " (яскравість)" if luminance_only else ""
+            self.info_label.config(text=f"Застосовано: Еквалізація гістограми{suffix}")
+    
+    def apply_matching(self):
+        if self.processor.original_image is None:
+            messagebox.showwarning("Попередження", "Спочатку завантажте зображення!")
+            return
+        
+        file_path = filedialog.askopenfilename(
+            title="Виберіть еталонне зображення або збережену CDF",
+            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.gif *.tif *.tiff"), ("CDF", "*.npy")]
+        )
+        if not file_path:
+            return
+        try:
+            target_cdf = self.reference_cache.get(file_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Помилка", f"Не вдалося прочитати еталон: {e}")
+            return
+        
+        self.processor.reset_image()
+        luminance_only = self.match_luminance.get()
+        try:
+            result = self.processor.histogram_matching(target_cdf, luminance_only=luminance_only)
+        except Exception as e:
+            messagebox.showerror("Помилка", f"Не вдалося застосувати відповідність еталону: {e}")
+            return
+        if result:
+            # Для поканальної відповідності показуємо середню з таблиць каналів
+            curve = result[1].mean(axis=0)
+            self.update_display(show_transform=True, transform_type="matching",
+                              transform_data=(np.arange(256), curve))
+            self.info_label.config(text=f"Застосовано: Відповідність гістограмі {os.path.basename(file_path)}")
+    
+    def apply_clahe(self):
+        if self.processor.original_image is None:
+            messagebox.showwarning("Попередження", "Спочатку завантажте зображення!")
+            return
+        
+        self.processor.reset_image()
+        clip_limit = self.clahe_clip_scale.get()
+        tiles = self.clahe_tiles_scale.get()
+        result = self.processor.clahe(tiles=tiles, clip_limit=clip_limit)
+        if result:
+            self.update_display(show_transform=True, transform_type="clahe")
+            self.info_label.config(text=f"Застосовано: CLAHE (ліміт={clip_limit:.1f}, тайли={tiles}×{tiles})")
     
     def apply_power(self):
         if self.processor.original_image is None:
@@ -347,88 +377,46 @@ class HistogramGUI:
             canvas.create_image(canvas_width // 2, canvas_height // 2, 
                               anchor=tk.CENTER, image=self.processed_display)
     
+    # Затримка перемальовування графіків: кілька швидких операцій - одне оновлення
+    PLOT_THROTTLE_MS = 40
+    
     def update_plots(self, show_transform=False, transform_type=None, transform_data=None):
-        """Оновлення графіків"""
-        self.figure.clear()
-        
+        """Оновлення графіків (перемальовування відкладається і зливається)"""
+        self._plot_state = self._plot_request = (show_transform, transform_type, transform_data)
+        if self._plot_job is None:
+            self._plot_job = self.root.after(self.PLOT_THROTTLE_MS, self.flush_plots)
+    
+    def flush_plots(self):
+        """Негайно виконати відкладене оновлення графіків"""
+        if self._plot_job is not None:
+            self.root.after_cancel(self._plot_job)
+            self._plot_job = None
+        request, self._plot_request = self._plot_request, None
+        if request is not None:
+            self._redraw_plots(*request)
+    
+    def _redraw_plots(self, show_transform=False, transform_type=None, transform_data=None):
         if self.processor.original_image is None:
             return
         
-        if show_transform and transform_type:
-            # 4 графіки: оригінальна гістограма, функція перетворення, 
-            # оброблена гістограма, порівняння
-            gs = self.figure.add_gridspec(2, 3, hspace=0.3, wspace=0.3)
-            ax1 = self.figure.add_subplot(gs[0, 0])
-            ax2 = self.figure.add_subplot(gs[0, 1])
-            ax3 = self.figure.add_subplot(gs[0, 2])
-            ax4 = self.figure.add_subplot(gs[1, :])
+        data = report_data(self.processor, transform_type if show_transform else None, transform_data)
+        full_redraw = self.plots.update(data)
+        if full_redraw or self._plot_background is None:
+            # Повне малювання: осі, підписи, сітка; лінії домальовує _on_plot_draw
+            self.canvas_plot.draw()
         else:
-            # Тільки оригінальна гістограма
-            ax1 = self.figure.add_subplot(1, 1, 1)
-        
-        # Оригінальна гістограма
-        hist_r, hist_g, hist_b = self.processor.get_histogram(self.processor.original_image)
-        ax1.plot(hist_r, color='red', alpha=0.7, label='R', linewidth=1.5)
-        ax1.plot(hist_g, color='green', alpha=0.7, label='G', linewidth=1.5)
-        ax1.plot(hist_b, color='blue', alpha=0.7, label='B', linewidth=1.5)
-        ax1.set_title('Гістограма оригінального зображення', fontsize=10, fontweight='bold')
-        ax1.set_xlabel('Яскравість')
-        ax1.set_ylabel('Кількість пікселів')
-        ax1.legend()
-        ax1.grid(True, alpha=0.3)
-        
-        if show_transform and transform_type:
-            # Функція перетворення
-            if transform_type == "equalization":
-                # Для еквалізації показуємо CDF
-                img_gray = np.array(self.processor.original_image.convert('L'))
-                hist, bins = np.histogram(img_gray.flatten(), 256, [0, 256])
-                cdf = hist.cumsum()
-                cdf_normalized = cdf * 255 / cdf[-1]
-                
-                ax2.plot(range(256), cdf_normalized, color='purple', linewidth=2)
-                ax2.set_title('Функція еквалізації (CDF)', fontsize=10, fontweight='bold')
-            else:
-                # Для інших перетворень показуємо функцію
-                x, y = transform_data
-                ax2.plot(x, y, color='purple', linewidth=2)
-                ax2.plot([0, 255], [0, 255], 'k--', alpha=0.3, label='y=x')
-                ax2.legend()
-                title = 'Функція степеневого перетворення' if transform_type == "power" else 'Функція логарифмічного перетворення'
-                ax2.set_title(title, fontsize=10, fontweight='bold')
-            
-            ax2.set_ylabel('Вихідна яскравість')
-            ax2.grid(True, alpha=0.3)
-            ax2.set_xlim([0, 255])
-            ax2.set_ylim([0, 255])
-            
-            # Гістограма обробленого зображення
-            hist_r2, hist_g2, hist_b2 = self.processor.get_histogram(self.processor.current_image)
-            ax3.plot(hist_r2, color='red', alpha=0.7, label='R', linewidth=1.5)
-            ax3.plot(hist_g2, color='green', alpha=0.7, label='G', linewidth=1.5)
-            ax3.plot(hist_b2, color='blue', alpha=0.7, label='B', linewidth=1.5)
-            ax3.set_title('Гістограма обробленого зображення', fontsize=10, fontweight='bold')
-            ax3.set_xlabel('Яскравість')
-            ax3.set_ylabel('Кількість пікселів')
-            ax3.legend()
-            ax3.grid(True, alpha=0.3)
-            
-            # Порівняння гістограм (сумарна для всіх каналів)
-            hist_orig_total = hist_r + hist_g + hist_b
-            hist_proc_total = hist_r2 + hist_g2 + hist_b2
-            
-            ax4.plot(hist_orig_total, color='blue', alpha=0.6, label='Оригінал', linewidth=2)
-            ax4.plot(hist_proc_total, color='red', alpha=0.6, label='Оброблено', linewidth=2)
-            ax4.set_title('Порівняння гістограм', fontsize=10, fontweight='bold')
-            ax4.set_xlabel('Яскравість')
-            ax4.set_ylabel('Кількість пікселів')
-            ax4.legend()
-            ax4.grid(True, alpha=0.3)
-        
-        self.canvas_plot.draw()
+            # Змінилися лише дані: відновити фон і перемалювати тільки лінії
+            self.canvas_plot.restore_region(self._plot_background)
+            self.plots.draw_lines()
+            self.canvas_plot.blit(self.figure.bbox)
+    
+    def _on_plot_draw(self, event):
+        """Після повного малювання зберегти фон без ліній і домалювати лінії"""
+        self._plot_background = self.canvas_plot.copy_from_bbox(self.figure.bbox)
+        self.plots.draw_lines()
 
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = HistogramGUI(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
@@ -0,0 +1,623 @@
+"""Обробка гістограм зображень без GUI.
+
+Гістограми і статистика, еквалізація, CLAHE, відповідність еталону,
+степеневе і логарифмічне перетворення (HistogramProcessor), а також графіки
+і звіти на полотні Agg. Модуль не імпортує tkinter і matplotlib.pyplot, тож
+його використовують і GUI (main.py), і потокова обробка (stream.py), і
+пакетні звіти в пулі процесів (reports.py).
+"""
+from PIL import Image
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import tempfile
+
+
+# Коефіцієнти яскравості ITU-R 601 у фіксованій точці, як у PIL convert('L')
+LUMA_WEIGHTS = (19595, 38470, 7471)
+
+
+def luminance(img_array):
+    """Яскравість масиву RGB uint8, тотожна Image.convert('L')"""
+    img_array = np.asarray(img_array)
+    lum = img_array[..., 0] * np.uint32(LUMA_WEIGHTS[0])
+    lum += img_array[..., 1] * np.uint32(LUMA_WEIGHTS[1])
+    lum += img_array[..., 2] * np.uint32(LUMA_WEIGHTS[2])
+    lum += np.uint32(0x8000)
+    return (lum >> 16).astype(np.uint8)
+
+
+def bincount_histograms(img_array, with_luminance=False, chunk_pixels=1 << 16):
+    """Гістограми всіх каналів масиву uint8 одним bincount на порцію пікселів.
+    Значення каналу k зсуваються на 256*k, тож один bincount рахує всі канали;
+    порції обмежують розмір тимчасового цілочисельного масиву.
+    Повертає масив (канали [+ яскравість], 256).
+    """
+    img_array = np.asarray(img_array)
+    pixels = img_array.reshape(-1, img_array.shape[2] if img_array.ndim == 3 else 1)
+    channels = pixels.shape[1]
+    add_luminance = with_luminance and channels == 3
+    rows = channels + add_luminance
+    offsets = np.arange(channels, dtype=np.intp) * 256
+    counts = np.zeros(rows * 256, dtype=np.int64)
+    buf = np.empty((chunk_pixels, rows), dtype=np.intp)
+
+    for start in range(0, len(pixels), chunk_pixels):
+        part = pixels[start:start + chunk_pixels]
+        b = buf[:len(part)]
+        np.add(part, offsets, out=b[:, :channels], casting='unsafe')
+        if add_luminance:
+            b[:, channels] = luminance(part)
+            b[:, channels] += channels * 256
+        counts += np.bincount(b.ravel(), minlength=rows * 256)
+    return counts.reshape(rows, 256)
+
+
+def histograms(img, with_luminance=False):
+    """Гістограми всіх каналів (і яскравості) зображення PIL або масиву uint8.
+    Для PIL - один прохід у C (Image.histogram), для масивів - bincount_histograms.
+    """
+    if isinstance(img, Image.Image):
+        hist = np.array(img.histogram(), dtype=np.int64).reshape(-1, 256)
+        if with_luminance and len(img.getbands()) == 3:
+            hist = np.vstack([hist, img.convert('L').histogram()])
+        return hist
+    return bincount_histograms(img, with_luminance)
+
+
+def equalization_lut(hist):
+    """Таблиця еквалізації за гістограмою: (LUT uint8, CDF, масштабована в [0,255])"""
+    cdf = hist.cumsum()
+    cdf_normalized = cdf * 255 / cdf[-1]
+    # Дробова частина відкидається, як при записі float у масив uint8
+    return cdf_normalized.astype(np.uint8), cdf_normalized
+
+
+def _tile_edges(length, count):
+    """Межі count майже рівних тайлів уздовж осі довжини length"""
+    return np.arange(count + 1) * length // count
+
+
+def _tile_coords(length, edges):
+    """Для кожного рядка/стовпця: сусідні центри тайлів (i0, i1) і вага i1 для інтерполяції"""
+    centers = (edges[:-1] + edges[1:] - 1) / 2.0
+    position = np.interp(np.arange(length), centers, np.arange(len(centers)))
+    i0 = np.floor(position).astype(np.intp)
+    i1 = np.minimum(i0 + 1, len(centers) - 1)
+    return i0, i1, (position - i0).astype(np.float32)
+
+
+def clahe_channel(channel, tiles=(8, 8), clip_limit=2.0, max_workers=None, chunk_rows=64):
+    """Адаптивна еквалізація з обмеженням контрасту (CLAHE) для каналу uint8.
+    
+    Гістограми тайлів рахуються bincount по рядах тайлів, обрізаються на рівні
+    clip_limit * (пікселів тайла / 256) з рівномірним розподілом надлишку, а
+    таблиці сусідніх тайлів змішуються білінійно для кожного пікселя. Ряди
+    тайлів і порції рядків обробляються в пулі потоків.
+    """
+    channel = np.asarray(channel, dtype=np.uint8)
+    height, width = channel.shape
+    tiles_y, tiles_x = min(tiles[0], height), min(tiles[1], width)
+    ys, xs = _tile_edges(height, tiles_y), _tile_edges(width, tiles_x)
+    column_tile = np.repeat(np.arange(tiles_x, dtype=np.intp) * 256, np.diff(xs))
+    
+    def tile_row_histograms(i):
+        # Номер тайла стовпця, зсунутий на 256, плюс значення: один bincount на ряд тайлів
+        band = channel[ys[i]:ys[i + 1]]
+        return np.bincount((band + column_tile).ravel(), minlength=tiles_x * 256).reshape(tiles_x, 256)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hist = np.stack(list(executor.map(tile_row_histograms, range(tiles_y)))).astype(np.float32)
+        
+        # Обрізання гістограм і рівномірний розподіл надлишку - для всіх тайлів одразу
+        tile_pixels = (np.diff(ys)[:, None] * np.diff(xs)[None, :]).astype(np.float32)[:, :, None]
+        if clip_limit > 0:
+            limit = np.maximum(clip_limit * tile_pixels / 256, 1)
+            excess = np.maximum(hist - limit, 0).sum(axis=2, keepdims=True)
+            hist = np.minimum(hist, limit) + excess / 256
+        luts = (hist.cumsum(axis=2) * (255 / tile_pixels)).reshape(-1)
+        
+        y0, y1, wy = _tile_coords(height, ys)
+        x0, x1, wx = _tile_coords(width, xs)
+        result = np.empty_like(channel)
+        
+        def blend_rows(start):
+            stop = min(start + chunk_rows, height)
+            values = channel[start:stop].astype(np.intp)
+            row0, row1 = y0[start:stop, None] * tiles_x, y1[start:stop, None] * tiles_x
+            
+            def lookup(rows, cols):
+                return luts[(rows + cols) * 256 + values]
+            
+            top = lookup(row0, x0) * (1 - wx) + lookup(row0, x1) * wx
+            bottom = lookup(row1, x0) * (1 - wx) + lookup(row1, x1) * wx
+            weight = wy[start:stop, None]
+            blended = top * (1 - weight) + bottom * weight
+            result[start:stop] = np.clip(np.rint(blended), 0, 255)
+        
+        list(executor.map(blend_rows, range(0, height, chunk_rows)))
+    return result
+
+
+def reference_histograms(img):
+    """Гістограми R, G, B і яскравості Y (YCbCr) еталонного зображення"""
+    rgb = img.convert('RGB')
+    return np.vstack([histograms(rgb), rgb.convert('YCbCr').getchannel(0).histogram()])
+
+
+def reference_cdf(hist):
+    """Нормалізовані в [0,1] CDF рядків гістограми"""
+    cdf = np.cumsum(hist, axis=1, dtype=np.float64)
+    return cdf / cdf[:, -1:]
+
+
+def matching_luts(hist, target_cdf):
+    """Таблиці відповідності гістограмі: для кожного рівня - найменший рівень
+    еталона, CDF якого не менша за CDF джерела (O(256 log 256) на канал)
+    """
+    source_cdf = reference_cdf(np.asarray(hist))
+    luts = [np.searchsorted(target, source, side='left') for source, target in zip(source_cdf, target_cdf)]
+    return np.minimum(luts, 255).astype(np.uint8)
+
+
+class ReferenceCDFCache:
+    """CDF еталонних зображень для відповідності гістограм.
+    
+    Рахується один раз на еталон і зберігається в пам'яті та на диску (cache_dir);
+    ключ - шлях, розмір і час зміни файлу, тож змінений еталон рахується заново.
+    Файл .npy вважається вже збереженою CDF (рядки R, G, B, Y).
+    """
+    
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'lab3_reference_cdf')
+        self.memory = {}
+    
+    def _key(self, path):
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        return hashlib.blake2b(ident.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def get(self, path):
+        if path.lower().endswith('.npy'):
+            return check_reference_cdf(np.load(path))
+        key = self._key(path)
+        cdf = self.memory.get(key)
+        if cdf is not None:
+            return cdf
+        
+        cache_path = os.path.join(self.cache_dir, key + '.npy')
+        if os.path.exists(cache_path):
+            cdf = np.load(cache_path)
+        else:
+            with Image.open(path) as img:
+                cdf = reference_cdf(reference_histograms(img))
+            save_reference_cdf(cache_path, cdf)
+        self.memory[key] = cdf
+        return cdf
+
+
+def check_reference_cdf(cdf):
+    """Перевірка збереженої CDF еталона: масив (4, 256) чисел, що не спадають
+    в кожному рядку (R, G, B, Y) і мають додатне останнє значення; ValueError інакше.
+    Повертає CDF, нормалізовану в [0,1].
+    """
+    cdf = np.asarray(cdf)
+    if cdf.shape != (4, 256):
+        raise ValueError(f"CDF еталона має бути масивом (4, 256) для R, G, B і Y, отримано {cdf.shape}")
+    if not (np.issubdtype(cdf.dtype, np.floating) or np.issubdtype(cdf.dtype, np.integer)):
+        raise ValueError(f"CDF еталона має бути числовою, отримано {cdf.dtype}")
+    cdf = cdf.astype(np.float64)
+    if not np.all(np.isfinite(cdf)) or np.any(np.diff(cdf, axis=1) < 0):
+        raise ValueError("CDF еталона має бути скінченною і не спадати")
+    if np.any(cdf[:, -1] <= 0):
+        raise ValueError("Останнє значення кожного рядка CDF еталона має бути додатним")
+    return cdf / cdf[:, -1:]
+
+
+def save_reference_cdf(path, cdf):
+    """Атомарний запис CDF еталона (.npy)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, cdf)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+LEVELS = np.arange(256, dtype=np.float32)
+
+
+def power_lut(gamma=1.0):
+    """Таблиця степеневого перетворення (ті самі операції float32, що й попіксельно)"""
+    return (np.power(LEVELS / 255.0, gamma) * 255).astype(np.uint8)
+
+
+def log_lut(c=1.0):
+    """Таблиця логарифмічного перетворення s = c * ln(1 + r*(e-1)) * 255, r = pixel/255.
+    Для c > 1 значення понад 255 обрізаються (а не переповнюють uint8).
+    """
+    return np.clip(c * np.log(1 + LEVELS / 255.0 * (np.e - 1)) * 255, 0, 255).astype(np.uint8)
+
+
+class ImageStats:
+    """Статистика зображення, виведена з його гістограм (рядки R, G, B, яскравість):
+    гістограми, CDF, мінімум, максимум і середнє кожного рядка
+    """
+    
+    LUMINANCE = 3
+    
+    def __init__(self, hist):
+        self.histograms = hist
+        self.cdf = hist.cumsum(axis=1)
+        nonzero = hist > 0
+        self.min = nonzero.argmax(axis=1)
+        self.max = 255 - nonzero[:, ::-1].argmax(axis=1)
+        self.mean = (hist * np.arange(256)).sum(axis=1) / np.maximum(self.cdf[:, -1], 1)
+    
+    @classmethod
+    def from_image(cls, img):
+        return cls(histograms(img, with_luminance=True))
+    
+    def cdf_normalized(self, row):
+        """CDF рядка, масштабована в [0,255]"""
+        cdf = self.cdf[row]
+        return cdf * 255 / cdf[-1]
+
+
+class HistogramProcessor:
+    def __init__(self):
+        self.current_image = None
+        self.original_image = None
+        self.image_path = None
+        # Статистика оригіналу рахується один раз при завантаженні,
+        # обробленого зображення - один раз для кожного нового результату
+        self.original_stats = None
+        self._current_stats = (None, None)
+        self._transform_cache = OrderedDict()
+    
+    def load_image(self, path):
+        """Завантаження зображення"""
+        self.image_path = path
+        self.original_image = Image.open(path).convert('RGB')
+        self.original_stats = ImageStats.from_image(self.original_image)
+        self._current_stats = (None, None)
+        self._transform_cache.clear()
+        # Перетворення не змінюють зображення на місці, тому копія не потрібна
+        self.current_image = self.original_image
+        return self.current_image
+    
+    def reset_image(self):
+        """Скидання до оригінального зображення"""
+        if self.original_image:
+            self.current_image = self.original_image
+            return self.current_image
+        return None
+    
+    def get_stats(self, img=None):
+        """Статистика зображення (для оригіналу і поточного результату - з кешу)"""
+        if img is None:
+            img = self.current_image
+        if img is None:
+            return None
+        if img is self.original_image:
+            return self.original_stats
+        cached_image, stats = self._current_stats
+        if cached_image is not img:
+            stats = ImageStats.from_image(img)
+            self._current_stats = (img, stats)
+        return stats
+    
+    def get_histogram(self, img=None):
+        """Отримання гістограми зображення"""
+        stats = self.get_stats(img)
+        if stats is None:
+            return None, None, None
+        
+        hist_r, hist_g, hist_b = stats.histograms[:3]
+        
+        return hist_r, hist_g, hist_b
+    
+    def histogram_equalization(self, img=None, luminance_only=False):
+        """Еквалізація гістограми таблицею з 256 значень, побудованою з CDF.
+        luminance_only=True - еквалізується лише яскравість Y (YCbCr), без зсуву кольорів.
+        """
+        if img is None:
+            img = self.current_image
+        if img is None:
+            return None
+        
+        if luminance_only:
+            y, cb, cr = img.convert('YCbCr').split()
+            lut, cdf_normalized = equalization_lut(np.array(y.histogram()))
+            equalized = Image.merge('YCbCr', (y.point(lut.tolist()), cb, cr)).convert('RGB')
+        else:
+            # Еквалізація для кожного каналу окремо; гістограми - з кешу статистики
+            luts = [equalization_lut(hist) for hist in self.get_stats(img).histograms[:3]]
+            equalized = img.point([value for lut, _ in luts for value in lut.tolist()])
+            cdf_normalized = luts[-1][1]
+        
+        self.current_image = equalized
+        return self.current_image, cdf_normalized
+    
+    def clahe(self, img=None, tiles=8, clip_limit=2.0, luminance_only=True):
+        """Адаптивна еквалізація з обмеженням контрасту (CLAHE).
+        luminance_only=True - лише яскравість Y (YCbCr), інакше кожен канал окремо.
+        """
+        if img is None:
+            img = self.current_image
+        if img is None:
+            return None
+        
+        def equalize(band):
+            return Image.fromarray(clahe_channel(np.array(band), (tiles, tiles), clip_limit))
+        
+        if luminance_only:
+            y, cb, cr = img.convert('YCbCr').split()
+            self.current_image = Image.merge('YCbCr', (equalize(y), cb, cr)).convert('RGB')
+        else:
+            self.current_image = Image.merge(img.mode, [equalize(band) for band in img.split()])
+        return self.current_image
+    
+    def histogram_matching(self, target_cdf, img=None, luminance_only=False):
+        """Відповідність гістограмі еталона з CDF target_cdf (рядки R, G, B, Y).
+        Повертає (зображення, таблиці відповідності).
+        """
+        if img is None:
+            img = self.current_image
+        if img is None:
+            return None
+        
+        if luminance_only:
+            y, cb, cr = img.convert('YCbCr').split()
+            luts = matching_luts([y.histogram()], target_cdf[3:4])
+            self.current_image = Image.merge('YCbCr', (y.point(luts[0].tolist()), cb, cr)).convert('RGB')
+        else:
+            luts = matching_luts(self.get_stats(img).histograms[:3], target_cdf[:3])
+            self.current_image = img.point(luts.ravel().tolist())
+        return self.current_image, luts
+    
+    # Скільки результатів степеневого/логарифмічного перетворення тримати в кеші
+    TRANSFORM_CACHE_SIZE = 8
+    
+    def _curve_transform(self, name, param, curve_function):
+        """Застосування кривої з 256 значень як таблиці до поточного зображення.
+        Результат кешується за (зображення, перетворення, параметр), тож повернення
+        до попереднього значення параметра не перераховує зображення.
+        """
+        img = self.current_image
+        if img is None:
+            return None
+        
+        key = (id(img), name, param)
+        cached = self._transform_cache.get(key)
+        if cached is not None and cached[0] is img:
+            self._transform_cache.move_to_end(key)
+            _, result, curve = cached
+        else:
+            curve = curve_function(param)
+            result = img.point(curve.tolist() * len(img.getbands()))
+            # Зображення-джерело зберігається разом з результатом, тож його id не перевикористається
+            self._transform_cache[key] = (img, result, curve)
+            if len(self._transform_cache) > self.TRANSFORM_CACHE_SIZE:
+                self._transform_cache.popitem(last=False)
+        
+        self.current_image = result
+        # Та сама крива, що застосована до пікселів, є і функцією для графіка
+        return self.current_image, np.arange(256), curve
+    
+    def power_law_transform(self, gamma=1.0):
+        """Степеневе перетворення"""
+        return self._curve_transform('power', gamma, power_lut)
+    
+    def logarithmic_transform(self, c=1.0):
+        """Логарифмічне перетворення"""
+        return self._curve_transform('log', c, log_lut)
+    
+    def save_image(self, path):
+        """Збереження зображення"""
+        if self.current_image:
+            self.current_image.save(path)
+            return True
+        return False
+
+
+def transform_curves(original_stats, processed_stats, transform_type, transform_data=None):
+    """Дані графіка функції перетворення: ((x, y) кривої, CDF оригіналу для порівняння або None)"""
+    levels = np.arange(256)
+    if transform_type == "equalization":
+        return (levels, original_stats.cdf_normalized(ImageStats.LUMINANCE)), None
+    if transform_type == "clahe":
+        # Для CLAHE єдиної функції немає - порівнюємо CDF яскравості до і після
+        return ((levels, processed_stats.cdf_normalized(ImageStats.LUMINANCE)),
+                original_stats.cdf_normalized(ImageStats.LUMINANCE))
+    return transform_data, None
+
+
+def report_data(processor, transform_type=None, transform_data=None):
+    """Дані для графіків і звіту з кешованої статистики процесора.
+    Словник з масивів numpy, тож його можна передати в інший потік чи процес.
+    """
+    original_stats = processor.original_stats
+    data = {'transform_type': transform_type, 'original_hist': original_stats.histograms[:3]}
+    if transform_type:
+        processed_stats = processor.get_stats()
+        data['processed_hist'] = processed_stats.histograms[:3]
+        data['curve'], data['reference'] = transform_curves(original_stats, processed_stats,
+                                                            transform_type, transform_data)
+    return data
+
+
+class HistogramPlots:
+    """Осі й лінії графіків гістограм на фігурі matplotlib.
+    
+    Осі створюються раз на макет ('single' або 'transform'), далі лише
+    оновлюються дані ліній. animated=True - лінії малюються окремо поверх
+    збереженого фону (blit у GUI); для звіту лінії звичайні.
+    """
+    
+    def __init__(self, figure, animated=False):
+        self.figure = figure
+        self.animated = animated
+        self.layout = None
+        self.transform_type = None
+        self.lines = {}
+        self.axes = {}
+    
+    def build(self, layout):
+        """Створення осей і ліній для макета"""
+        self.figure.clear()
+        self.layout = layout
+        self.transform_type = None
+        self.lines = lines = {}
+        levels = np.arange(256)
+        zeros = np.zeros(256)
+        
+        def line(key, ax, *args, **kwargs):
+            lines[key], = ax.plot(*args, animated=self.animated, **kwargs)
+        
+        def histogram_axes(ax, key, title):
+            for band, color in (('R', 'red'), ('G', 'green'), ('B', 'blue')):
+                line((key, band), ax, levels, zeros, color=color, alpha=0.7, label=band, linewidth=1.5)
+            ax.set_title(title, fontsize=10, fontweight='bold')
+            ax.set_xlabel('Яскравість')
+            ax.set_ylabel('Кількість пікселів')
+            ax.set_xlim([0, 255])
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+        
+        if layout == 'transform':
+            # 4 графіки: оригінальна гістограма, функція перетворення, 
+            # оброблена гістограма, порівняння
+            gs = self.figure.add_gridspec(2, 3, hspace=0.3, wspace=0.3)
+            ax1 = self.figure.add_subplot(gs[0, 0])
+            ax2 = self.figure.add_subplot(gs[0, 1])
+            ax3 = self.figure.add_subplot(gs[0, 2])
+            ax4 = self.figure.add_subplot(gs[1, :])
+        else:
+            # Тільки оригінальна гістограма
+            ax1 = self.figure.add_subplot(1, 1, 1)
+        self.axes = {'original': ax1}
+        histogram_axes(ax1, 'original', 'Гістограма оригінального зображення')
+        
+        if layout == 'transform':
+            self.axes.update(transform=ax2, processed=ax3, comparison=ax4)
+            line('reference', ax2, levels, zeros, color='blue', linewidth=2, label='Оригінал')
+            line('curve', ax2, levels, zeros, color='purple', linewidth=2)
+            line('identity', ax2, [0, 255], [0, 255], 'k--', alpha=0.3, label='y=x')
+            ax2.set_ylabel('Вихідна яскравість')
+            ax2.grid(True, alpha=0.3)
+            ax2.set_xlim([0, 255])
+            ax2.set_ylim([0, 255])
+            
+            histogram_axes(ax3, 'processed', 'Гістограма обробленого зображення')
+            
+            # Порівняння гістограм (сумарна для всіх каналів)
+            line('total_original', ax4, levels, zeros, color='blue', alpha=0.6, label='Оригінал', linewidth=2)
+            line('total_processed', ax4, levels, zeros, color='red', alpha=0.6, label='Оброблено', linewidth=2)
+            ax4.set_title('Порівняння гістограм', fontsize=10, fontweight='bold')
+            ax4.set_xlabel('Яскравість')
+            ax4.set_ylabel('Кількість пікселів')
+            ax4.set_xlim([0, 255])
+            ax4.legend()
+            ax4.grid(True, alpha=0.3)
+    
+    def set_transform_type(self, transform_type):
+        """Заголовок і легенда графіка функції перетворення (змінюються лише зі зміною типу)"""
+        ax2 = self.axes['transform']
+        lines = self.lines
+        lines['reference'].set_visible(transform_type == "clahe")
+        lines['identity'].set_visible(transform_type not in ("equalization", "clahe"))
+        lines['curve'].set_label('CLAHE' if transform_type == "clahe" else '_curve')
+        if transform_type == "equalization":
+            title = 'Функція еквалізації (CDF)'
+        elif transform_type == "clahe":
+            title = 'CDF яскравості'
+        elif transform_type == "matching":
+            title = 'Функція відповідності еталону'
+        elif transform_type == "power":
+            title = 'Функція степеневого перетворення'
+        else:
+            title = 'Функція логарифмічного перетворення'
+        ax2.set_title(title, fontsize=10, fontweight='bold')
+        
+        if ax2.get_legend() is not None:
+            ax2.get_legend().remove()
+        handles = [line for line in (lines['reference'], lines['curve'], lines['identity'])
+                   if line.get_visible() and not line.get_label().startswith('_')]
+        if handles:
+            ax2.legend(handles=handles)
+        self.transform_type = transform_type
+    
+    @staticmethod
+    def _fit_ylim(ax, peak):
+        """Нова межа осі Y, лише якщо дані вийшли за неї або стали набагато меншими"""
+        top = ax.get_ylim()[1]
+        if peak <= top and peak >= top * 0.5:
+            return False
+        ax.set_ylim([0, max(peak, 1) * 1.05])
+        return True
+    
+    def update(self, data):
+        """Оновлення ліній даними report_data(); True - змінилися осі і потрібне повне малювання"""
+        transform_type = data['transform_type']
+        layout = 'transform' if transform_type else 'single'
+        full_redraw = layout != self.layout
+        if full_redraw:
+            self.build(layout)
+        lines = self.lines
+        
+        original_hist = data['original_hist']
+        for band, hist in zip('RGB', original_hist):
+            lines[('original', band)].set_ydata(hist)
+        full_redraw |= self._fit_ylim(self.axes['original'], original_hist.max())
+        
+        if layout == 'transform':
+            if transform_type != self.transform_type:
+                self.set_transform_type(transform_type)
+                full_redraw = True
+            
+            # Функція перетворення
+            lines['curve'].set_data(*data['curve'])
+            if data['reference'] is not None:
+                lines['reference'].set_ydata(data['reference'])
+            
+            # Гістограма обробленого зображення
+            processed_hist = data['processed_hist']
+            for band, hist in zip('RGB', processed_hist):
+                lines[('processed', band)].set_ydata(hist)
+            full_redraw |= self._fit_ylim(self.axes['processed'], processed_hist.max())
+            
+            total_original = original_hist.sum(axis=0)
+            total_processed = processed_hist.sum(axis=0)
+            lines['total_original'].set_ydata(total_original)
+            lines['total_processed'].set_ydata(total_processed)
+            full_redraw |= self._fit_ylim(self.axes['comparison'],
+                                          max(total_original.max(), total_processed.max()))
+        return full_redraw
+    
+    def draw_lines(self):
+        for line in self.lines.values():
+            if line.get_visible():
+                line.axes.draw_artist(line)
+
+
+REPORT_FIGSIZE = (14, 5)
+REPORT_DPI = 150
+
+
+def render_report(path, data, dpi=REPORT_DPI):
+    """Звіт у файл: окрема фігура з полотном Agg, без Tk і без живої фігури GUI,
+    тож функцію можна викликати у фоновому потоці або іншому процесі
+    """
+    figure = Figure(figsize=REPORT_FIGSIZE)
+    FigureCanvasAgg(figure)
+    HistogramPlots(figure).update(data)
+    figure.savefig(path, dpi=dpi, bbox_inches='tight')
+    return path
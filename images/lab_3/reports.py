@@ -0,0 +1,141 @@
+"""Пакетне створення звітів з гістограмами для каталогу зображень.
+
+Кожне зображення читається, обробляється обраним методом і рендериться у
+PNG-звіт (той самий макет, що й "Зберегти звіт" у GUI) в окремому процесі;
+малювання - на полотні Agg, без Tk.
+
+Запуск:
+    python reports.py photos/ -o reports/ --transform equalize
+    python reports.py photos/ -o reports/ --transform power --gamma 0.7 --workers 4
+    python reports.py photos/ -o reports/ --transform match --reference reference.png
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from processing import REPORT_DPI, HistogramProcessor, ReferenceCDFCache, render_report, report_data
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff')
+
+TRANSFORMS = ('none', 'equalize', 'clahe', 'power', 'log', 'match')
+
+
+def iter_jobs(folder, output_dir, suffix='_report'):
+    """Потоково генерує пари (зображення, файл звіту) для каталогу"""
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                stem = os.path.splitext(os.path.relpath(path, folder))[0]
+                yield path, os.path.join(output_dir, stem + suffix + '.png')
+
+
+def apply_transform(processor, transform, options):
+    """Застосовує метод до завантаженого зображення; повертає (transform_type, transform_data) для звіту"""
+    luminance_only = options.get('luminance_only', False)
+    if transform == 'equalize':
+        processor.histogram_equalization(luminance_only=luminance_only)
+        return "equalization", None
+    if transform == 'clahe':
+        processor.clahe(tiles=options.get('tiles', 8), clip_limit=options.get('clip_limit', 2.0))
+        return "clahe", None
+    if transform == 'match':
+        _, luts = processor.histogram_matching(options['target_cdf'], luminance_only=luminance_only)
+        return "matching", (np.arange(256), luts.mean(axis=0))
+    if transform == 'power':
+        _, x, y = processor.power_law_transform(options.get('gamma', 1.0))
+        return "power", (x, y)
+    if transform == 'log':
+        _, x, y = processor.logarithmic_transform(options.get('c', 1.0))
+        return "log", (x, y)
+    return None, None
+
+
+def process_file(path, output_path, transform, options, dpi=REPORT_DPI):
+    """Обробка одного зображення і рендеринг звіту (виконується у процесі-виконавці)"""
+    try:
+        processor = HistogramProcessor()
+        processor.load_image(path)
+        transform_type, transform_data = apply_transform(processor, transform, options)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        render_report(output_path, report_data(processor, transform_type, transform_data), dpi)
+        return path, None
+    except Exception as e:  # одне пошкоджене зображення не зупиняє всю партію
+        return path, f"{type(e).__name__}: {e}"
+
+
+def run_reports(jobs, transform, options, workers=None, dpi=REPORT_DPI, report=print):
+    """Створює звіти для jobs у пулі процесів; повертає (кількість успішних, список помилок, секунди)"""
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+    done_count = 0
+    errors = []
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        jobs = iter(jobs)
+        exhausted = False
+        while pending or not exhausted:
+            # Обмежена кількість завдань у черзі: каталог не обходиться наперед повністю
+            while not exhausted and len(pending) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(process_file, job[0], job[1], transform, options, dpi))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, error = future.result()
+                if error is None:
+                    done_count += 1
+                else:
+                    errors.append((path, error))
+                    report(f"Помилка: {path}: {error}")
+
+    return done_count, errors, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Звіти з гістограмами для каталогу зображень")
+    parser.add_argument('folder', help="Каталог із зображеннями")
+    parser.add_argument('-o', '--output-dir', required=True, help="Каталог для звітів")
+    parser.add_argument('--transform', default='equalize', choices=TRANSFORMS)
+    parser.add_argument('--luminance', action='store_true', help="Еквалізація/відповідність лише яскравості")
+    parser.add_argument('--tiles', type=int, default=8, help="Кількість тайлів CLAHE по кожній осі")
+    parser.add_argument('--clip-limit', type=float, default=2.0, help="Ліміт контрасту CLAHE")
+    parser.add_argument('--gamma', type=float, default=1.0, help="γ для степеневого перетворення")
+    parser.add_argument('--c', type=float, default=1.0, help="c для логарифмічного перетворення")
+    parser.add_argument('--reference', help="Еталонне зображення або збережена CDF (.npy) для --transform match")
+    parser.add_argument('--reference-cache', help="Каталог кешу CDF еталонів")
+    parser.add_argument('--dpi', type=int, default=REPORT_DPI)
+    parser.add_argument('--workers', type=int, help="Кількість процесів (за замовчуванням - кількість ядер)")
+    args = parser.parse_args(argv)
+
+    options = {'luminance_only': args.luminance, 'tiles': args.tiles, 'clip_limit': args.clip_limit,
+               'gamma': args.gamma, 'c': args.c}
+    if args.transform == 'match':
+        if not args.reference:
+            parser.error("Для --transform match потрібен --reference")
+        # CDF еталона рахується один раз і передається всім процесам
+        options['target_cdf'] = ReferenceCDFCache(args.reference_cache).get(args.reference)
+
+    jobs = iter_jobs(args.folder, args.output_dir)
+    done_count, errors, elapsed = run_reports(jobs, args.transform, options, args.workers, args.dpi)
+
+    total = done_count + len(errors)
+    print(f"Створено {done_count} з {total} звітів за {elapsed:.2f} с")
+    if errors:
+        print(f"Помилок: {len(errors)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
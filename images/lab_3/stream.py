@@ -0,0 +1,127 @@
+"""Потокова обробка гістограм для зображень, що не вміщуються в пам'ять.
+
+Перший прохід читає зображення порціями рядків і накопичує точні гістограми
+каналів, з них будуються таблиці еквалізації (або степеневого/логарифмічного
+перетворення), другий прохід застосовує таблиці порціями і пише результат у
+вихідний файл. У пам'яті одночасно лише одна порція рядків.
+
+Для відповідності гістограмі CDF еталона рахується один раз і кешується на
+диску, тож обробка багатьох файлів з одним еталоном не читає його повторно.
+
+Запуск:
+    python stream.py scan.tif out.tif --transform equalize
+    python stream.py scan.raw out.npy --raw-shape 40000 60000 3 --transform power --gamma 0.7
+    python stream.py scan.tif out.tif --transform match --reference reference.png
+"""
+import argparse
+import time
+
+import numpy as np
+
+from image_io import create_output, open_source
+from processing import (ImageStats, ReferenceCDFCache, bincount_histograms, equalization_lut, log_lut, matching_luts,
+                        power_lut)
+
+
+TRANSFORMS = ('equalize', 'power', 'log', 'match')
+
+
+def iter_chunks(height, chunk_rows):
+    for start in range(0, height, chunk_rows):
+        yield start, min(start + chunk_rows, height)
+
+
+def stream_histograms(data, chunk_rows=1024):
+    """Перший прохід: точні гістограми каналів (канали, 256) порціями рядків"""
+    channels = data.shape[2] if data.ndim == 3 else 1
+    hist = np.zeros((channels, 256), dtype=np.int64)
+    for start, stop in iter_chunks(data.shape[0], chunk_rows):
+        hist += bincount_histograms(data[start:stop])
+    return hist
+
+
+def color_channels(channels):
+    """Кількість каналів кольору (1 або 3) без альфа-каналу; інші зображення відхиляються"""
+    if channels not in (1, 2, 3, 4):
+        raise ValueError(f"Підтримуються зображення з 1-4 каналами (сірий, RGB, +альфа), отримано {channels}")
+    return 3 if channels >= 3 else 1
+
+
+def build_luts(hist, transform, gamma=1.0, c=1.0, target_cdf=None):
+    """Таблиці для кожного каналу: еквалізація і відповідність еталону - своя
+    для каналу, степеневе і логарифмічне перетворення - спільна. Альфа-канал
+    (напівтонове + альфа, RGBA) переноситься без змін тотожною таблицею.
+    """
+    channels = len(hist)
+    color = color_channels(channels)
+    if transform == 'equalize':
+        luts = np.stack([equalization_lut(channel_hist)[0] for channel_hist in hist[:color]])
+    elif transform == 'match':
+        # Напівтонове зображення зіставляється з яскравістю еталона
+        luts = matching_luts(hist[:color], target_cdf[:3] if color == 3 else target_cdf[3:4])
+    else:
+        lut = power_lut(gamma) if transform == 'power' else log_lut(c)
+        luts = np.repeat(lut[None, :], color, axis=0)
+    if channels > color:
+        identity = np.arange(256, dtype=np.uint8)
+        luts = np.concatenate([luts, identity[None, :]])
+    return luts
+
+
+def stream_apply(data, output, luts, chunk_rows=1024):
+    """Другий прохід: застосування таблиць порціями рядків"""
+    for start, stop in iter_chunks(data.shape[0], chunk_rows):
+        chunk = np.asarray(data[start:stop])
+        if chunk.ndim == 2:
+            output[start:stop] = luts[0][chunk]
+        else:
+            for k in range(chunk.shape[2]):
+                output[start:stop, :, k] = luts[k][chunk[:, :, k]]
+    if hasattr(output, 'flush'):
+        output.flush()
+
+
+def stream_transform(src, dst, transform='equalize', gamma=1.0, c=1.0, chunk_rows=1024, raw_shape=None,
+                     target_cdf=None, raw_dtype='uint8'):
+    """Двопрохідне перетворення src -> dst; повертає статистику вхідного зображення"""
+    data = open_source(src, raw_shape, raw_dtype)
+    color_channels(data.shape[2] if data.ndim == 3 else 1)  # до першого проходу, а не після нього
+    hist = stream_histograms(data, chunk_rows)
+    luts = build_luts(hist, transform, gamma, c, target_cdf)
+    output = create_output(dst, data.shape)
+    stream_apply(data, output, luts, chunk_rows)
+    del output
+    return ImageStats(hist)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Потокова еквалізація і градаційні перетворення великих зображень")
+    parser.add_argument('source', help="Вхідний файл (.tif, .npy або сирі дані uint8)")
+    parser.add_argument('output', help="Вихідний файл (.tif, .npy або сирі дані)")
+    parser.add_argument('--transform', default='equalize', choices=TRANSFORMS)
+    parser.add_argument('--gamma', type=float, default=1.0, help="γ для степеневого перетворення")
+    parser.add_argument('--c', type=float, default=1.0, help="c для логарифмічного перетворення")
+    parser.add_argument('--reference', help="Еталонне зображення або збережена CDF (.npy) для --transform match")
+    parser.add_argument('--reference-cache', help="Каталог кешу CDF еталонів")
+    parser.add_argument('--chunk-rows', type=int, default=1024, help="Кількість рядків у порції")
+    parser.add_argument('--raw-shape', type=int, nargs='+', help="Розмір сирих даних: висота ширина [канали]")
+    parser.add_argument('--raw-dtype', default='uint8',
+                        help="Тип сирих даних (uint8 або ширший беззнаковий, напр. uint16 - масштабується до 8 біт)")
+    args = parser.parse_args(argv)
+    target_cdf = None
+    if args.transform == 'match':
+        if not args.reference:
+            parser.error("Для --transform match потрібен --reference")
+        target_cdf = ReferenceCDFCache(args.reference_cache).get(args.reference)
+
+    start = time.perf_counter()
+    stats = stream_transform(args.source, args.output, args.transform, args.gamma, args.c,
+                             args.chunk_rows, args.raw_shape, target_cdf, args.raw_dtype)
+    elapsed = time.perf_counter() - start
+    print(f"{args.transform}: {stats.cdf[0, -1]} пікселів за {elapsed:.2f} с")
+    for k in range(len(stats.histograms)):
+        print(f"  канал {k}: min={stats.min[k]} max={stats.max[k]} середнє={stats.mean[k]:.2f}")
+
+
+if __name__ == "__main__":
+    main()